@@ -0,0 +1,158 @@
+# api_client.py - Pooled, non-blocking HTTP client for the Tk frontend
+import itertools
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+MAX_WORKERS = 4
+POLL_INTERVAL_MS = 20   # how often the Tk main loop picks up finished requests
+REQUEST_TIMEOUT = 30    # seconds; keeps a hung server from tying up a worker for good
+EVENT_READ_TIMEOUT = 45 # seconds of silence (the server sends heartbeats) before an event stream is presumed dead
+EVENT_RETRY_SECONDS = 2
+
+
+class ApiClient:
+    """Runs backend requests on a small thread pool over one keep-alive Session.
+
+    Callbacks always run on the Tk main thread: workers put finished requests
+    on a queue that the main loop drains via master.after. Requests submitted
+    on the same channel supersede each other, so when the user flicks through
+    categories only the newest listing is delivered.
+    """
+
+    def __init__(self, master, base_url, max_workers=MAX_WORKERS):
+        self.master = master
+        self.base_url = base_url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='api')
+        self.finished = queue.Queue()
+        self.tickets = itertools.count(1)
+        self.latest = {}       # channel -> (ticket, future) of its newest request
+        self.etag_cache = {}   # URL -> (ETag, payload) for conditional GETs
+        self.callbacks = queue.Queue()  # (callback, args) posted by the event listener thread
+        self.closed = threading.Event()
+        self.master.after(POLL_INTERVAL_MS, self.poll)
+
+    def submit(self, task, on_success, on_error=None, channel=None):
+        """Runs task() on the pool, then on_success(result) or on_error(exception) on the Tk thread."""
+        ticket = next(self.tickets)
+        if channel is not None:
+            self.cancel(channel)
+        future = self.executor.submit(task)
+        if channel is not None:
+            self.latest[channel] = (ticket, future)
+        future.add_done_callback(lambda f: self.finished.put((channel, ticket, f, on_success, on_error)))
+        return future
+
+    def cancel(self, channel):
+        """Drops the pending request on channel: it never starts if still queued, and its result is ignored otherwise."""
+        latest = self.latest.pop(channel, None)
+        if latest is not None:
+            latest[1].cancel()
+
+    def poll(self):
+        # Reschedule first: a callback may open a modal dialog, whose nested
+        # event loop must keep delivering results.
+        self.master.after(POLL_INTERVAL_MS, self.poll)
+        while True:
+            try:
+                callback, args = self.callbacks.get_nowait()
+            except queue.Empty:
+                break
+            callback(*args)
+        while True:
+            try:
+                channel, ticket, future, on_success, on_error = self.finished.get_nowait()
+            except queue.Empty:
+                return
+            if future.cancelled():
+                continue
+            if channel is not None:
+                latest = self.latest.get(channel)
+                if latest is None or latest[0] != ticket:
+                    continue  # superseded by a newer request on the same channel
+                del self.latest[channel]
+            error = future.exception()
+            if error is None:
+                on_success(future.result())
+            elif on_error is not None:
+                on_error(error)
+
+    def close(self):
+        self.closed.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+    def listen(self, path, on_event, on_connect=None):
+        """Follows a Server-Sent Events stream on a background thread, reconnecting when it drops.
+
+        on_event(name, data) gets each event with its JSON data decoded;
+        on_connect() runs after every (re)connect. Both run on the Tk thread.
+        """
+        thread = threading.Thread(target=self._listen_loop, args=(path, on_event, on_connect),
+                                  name='api-events', daemon=True)
+        thread.start()
+        return thread
+
+    def _listen_loop(self, path, on_event, on_connect):
+        while not self.closed.is_set():
+            try:
+                # Its own connection: the stream would otherwise hold a pooled one forever
+                with requests.get(self.base_url + path, stream=True, timeout=(REQUEST_TIMEOUT, EVENT_READ_TIMEOUT)) as response:
+                    response.raise_for_status()
+                    if on_connect is not None:
+                        self.callbacks.put((on_connect, ()))
+                    name, data = 'message', []
+                    for line in response.iter_lines(decode_unicode=True):
+                        if self.closed.is_set():
+                            return
+                        if not line:
+                            if data:
+                                self.callbacks.put((on_event, (name, json.loads('\n'.join(data)))))
+                            name, data = 'message', []
+                        elif not line.startswith(':'):  # ':' lines are heartbeats
+                            field, _, value = line.partition(':')
+                            value = value[1:] if value.startswith(' ') else value
+                            if field == 'event':
+                                name = value
+                            elif field == 'data':
+                                data.append(value)
+            except (requests.exceptions.RequestException, ValueError):
+                pass
+            self.closed.wait(EVENT_RETRY_SECONDS)
+
+    # --- Requests (called from worker threads) ---
+    def get_json(self, path, params=None, cache=True):
+        """GET returning decoded JSON. Responses with an ETag are cached per URL and
+        revalidated with If-None-Match, so an unchanged resource costs a bodiless 304.
+        cache=False skips that, e.g. for data the caller keeps itself."""
+        url = requests.Request('GET', self.base_url + path, params=params).prepare().url
+        cached = self.etag_cache.get(url) if cache else None
+        headers = {'If-None-Match': cached[0]} if cached else {}
+        response = self.session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        if response.status_code == 304 and cached:
+            return cached[1]
+        response.raise_for_status()
+        data = response.json()
+        etag = response.headers.get('ETag')
+        if etag and cache:
+            self.etag_cache[url] = (etag, data)
+        return data
+
+    def get_bytes(self, path, params=None):
+        response = self.session.get(self.base_url + path, params=params, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response.content
+
+    def send(self, method, path, **kwargs):
+        """Any other request; returns the decoded JSON body."""
+        response = self.session.request(method, self.base_url + path, timeout=REQUEST_TIMEOUT, **kwargs)
+        response.raise_for_status()
+        return response.json()
@@ -1,10 +1,19 @@
 # backend.py - Updated with /stats Route and Screenshot Upload
-from flask import Flask, jsonify, request, send_file, send_from_directory
+from flask import Flask, Response, jsonify, request, send_file, send_from_directory
 import database 
 import sys
 import os
 import base64
+import hashlib
+import json
+import mimetypes
+import re
+import tempfile
 from werkzeug.utils import secure_filename
+try:
+    from PIL import Image
+except ImportError:  # without Pillow, ?size= falls back to the original file
+    Image = None
 
 app = Flask(__name__, static_folder='.', static_url_path='')
 
@@ -12,28 +21,321 @@ app = Flask(__name__, static_folder='.', static_url_path='')
 UPLOAD_FOLDER = 'screenshots'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+UPLOAD_CHUNK_SIZE = 64 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024  # encoded records are sent in chunks of about this many characters
+
+# Scaled-down screenshot variants served by /screenshot/<name>?size=N. They are
+# generated at upload time (or on first request for older uploads) and cached on disk.
+THUMBNAIL_SIZES = (128, 600)
+THUMBNAIL_FOLDER = os.path.join(UPLOAD_FOLDER, 'thumbnails')
+
+# Screenshot files never change under a given name (uploads are content-addressed),
+# so clients may cache them for a year without revalidating.
+SCREENSHOT_MAX_AGE = 365 * 24 * 60 * 60
+# '<sha256>' or '<sha256>_<size>': the name already identifies the bytes
+CONTENT_ADDRESSED_NAME = re.compile(r'^[0-9a-f]{64}(_\d+)?$')
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+)
+
+# Optionally let a fronting web server send screenshot bytes: 'x-sendfile'
+# (Apache/lighttpd) or 'x-accel' (nginx, with X_ACCEL_PREFIX configured as an
+# internal location aliased to UPLOAD_FOLDER). Empty: Flask sends the file.
+SENDFILE_MODE = os.environ.get('LIBRARY_SENDFILE', '')
+X_ACCEL_PREFIX = os.environ.get('LIBRARY_X_ACCEL_PREFIX', '/internal/screenshots/')
+
+# GET /media pagination and projection
+MAX_PAGE_SIZE = 1000
+MEDIA_FIELDS = ('id', 'name', 'publication_date', 'author', 'category', 'screenshot')
+
+# Extras a mutating endpoint returns inline when asked with ?include=media,stats
+INCLUDE_OPTIONS = ('media', 'stats')
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+MAX_BATCH_SIZE = 10000
+
+# /media/query result limits
+DEFAULT_QUERY_RESULTS = 20
+MAX_QUERY_RESULTS = 100
+
+# /events sends a comment line this often, so dead connections are noticed
+# (and their subscriptions dropped) even when nothing changes
+EVENT_HEARTBEAT = 15
 
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
+if not os.path.exists(THUMBNAIL_FOLDER):
+    os.makedirs(THUMBNAIL_FOLDER)
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
+app.config['USE_X_SENDFILE'] = SENDFILE_MODE == 'x-sendfile'
+
+# file path -> ((mtime, size), (etag, mimetype)) for served screenshots
+screenshot_info_cache = {}
 
-def media_to_json(media_id, media_data):
-    """Converts a media dictionary entry into a JSON-serializable format with the ID."""
-    item = media_data.copy()
+def media_to_json(media_id, media_data, fields=None):
+    """Converts a media dictionary entry into a JSON-serializable format with the ID.
+
+    When fields is given only those keys (plus 'id') are included.
+    """
+    if fields:
+        item = {field: media_data.get(field) for field in fields}
+    else:
+        item = media_data.copy()
     item['id'] = media_id
     return item
 
+def parse_fields(fields_arg):
+    """Parses a comma-separated ?fields= value. Returns (fields or None, error message or None)."""
+    if not fields_arg:
+        return None, None
+    fields = [field.strip() for field in fields_arg.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in MEDIA_FIELDS]
+    if unknown:
+        return None, f'Unknown fields: {", ".join(unknown)}. Allowed: {", ".join(MEDIA_FIELDS)}'
+    return [field for field in fields if field != 'id'], None
+
+def parse_include():
+    """Parses a mutating endpoint's ?include= value. Returns (set of options, error message or None)."""
+    include = {option.strip() for option in request.args.get('include', '').split(',') if option.strip()}
+    unknown = include.difference(INCLUDE_OPTIONS)
+    if unknown:
+        return None, f'Unknown include options: {", ".join(sorted(unknown))}. Allowed: {", ".join(INCLUDE_OPTIONS)}'
+    return include, None
+
+def add_included(body, media_id, include):
+    """Adds the ?include= extras to a mutation's response body.
+
+    Called while the mutation still holds the store, so the record ('media',
+    null once deleted) and 'stats' are exactly the state it produced; 'version'
+    says which /media/changes version they belong to.
+    """
+    if include:
+        body['version'] = database.changes_version()
+    if 'media' in include:
+        media_data = database.get_media_by_id(media_id)
+        body['media'] = media_to_json(media_id, media_data) if media_data is not None else None
+    if 'stats' in include:
+        body['stats'] = database.get_media_statistics()
+    return body
+
+def versioned(build_response):
+    """Returns build_response() tagged with the store version as its ETag.
+
+    If the client already holds that version (If-None-Match), answers
+    304 Not Modified without building the response at all.
+    """
+    etag = database.get_version()
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = build_response()
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def versioned_json(build_payload):
+    return versioned(lambda: jsonify(build_payload()))
+
+def encode_media(media_id, media_data, fields=None):
+    """JSON-encodes a media item with its ID without copying the stored record."""
+    if fields:
+        return json.dumps(media_to_json(media_id, media_data, fields))
+    body = json.dumps(media_data)
+    # Splice the id into the encoded object instead of copying the dict to add it
+    return f'{body[:-1]}, "id": {media_id}}}' if body != '{}' else f'{{"id": {media_id}}}'
+
+def wants_stream():
+    """True when the client asked for a streamed listing (?stream=1 or Accept: application/x-ndjson)."""
+    return request.args.get('stream') == '1' or wants_ndjson()
+
+def wants_ndjson():
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+def chunked(pieces, size=STREAM_CHUNK_SIZE):
+    """Joins consecutive strings into chunks of about `size` characters, so a
+    response is not written to the socket one small record at a time."""
+    buffer, buffered = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= size:
+            yield ''.join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+def stream_media(items, fields=None):
+    """Streams (id, media) pairs as a JSON array, or as NDJSON if the client accepts it.
+
+    Items are encoded one at a time and sent in STREAM_CHUNK_SIZE chunks, so memory
+    use does not grow with the catalog.
+    """
+    if wants_ndjson():
+        def generate_ndjson():
+            for media_id, media_data in items:
+                yield encode_media(media_id, media_data, fields) + '\n'
+        return Response(chunked(generate_ndjson()), mimetype=NDJSON_MIMETYPE)
+
+    def generate_array():
+        separator = '['
+        for media_id, media_data in items:
+            yield separator + encode_media(media_id, media_data, fields)
+            separator = ','
+        yield '[]' if separator == '[' else ']'
+    return Response(chunked(generate_array()), mimetype='application/json')
+
 def allowed_file(filename):
     """Check if file extension is allowed."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def thumbnail_path(filename, size):
+    """Cache path of the size variant of an uploaded file: JPEG for JPEG sources, PNG otherwise."""
+    stem, ext = os.path.splitext(filename)
+    ext = '.jpg' if ext.lower() in ('.jpg', '.jpeg') else '.png'
+    return os.path.join(THUMBNAIL_FOLDER, f"{stem}_{size}{ext}")
+
+def make_thumbnail(file_path, size):
+    """Returns the path of the cached size variant of file_path, creating it if missing or stale.
+
+    Returns None when Pillow is not installed.
+    """
+    if Image is None:
+        return None
+    thumb_path = thumbnail_path(os.path.basename(file_path), size)
+    if os.path.exists(thumb_path) and os.path.getmtime(thumb_path) >= os.path.getmtime(file_path):
+        return thumb_path
+
+    # Each request writes its own temp file: concurrent first requests for the
+    # same variant must not share (and rename away) one another's file
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(thumb_path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out, Image.open(file_path) as img:
+            img.thumbnail((size, size), Image.Resampling.LANCZOS)
+            if thumb_path.endswith('.jpg'):
+                img.convert('RGB').save(out, format='JPEG', quality=85)
+            else:
+                img.save(out, format='PNG', optimize=True)
+        # Rename into place so concurrent requests never serve a half-written file
+        os.replace(temp_path, thumb_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return thumb_path
+
+def remove_thumbnails(filename):
+    for size in THUMBNAIL_SIZES:
+        thumb_path = thumbnail_path(filename, size)
+        if os.path.exists(thumb_path):
+            os.remove(thumb_path)
+
+def detect_mimetype(file_path):
+    """Sniffs the image type from the file's first bytes, falling back to its extension."""
+    with open(file_path, 'rb') as f:
+        head = f.read(8)
+    for signature, mimetype in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return mimetype
+    return mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+
+def screenshot_info(file_path):
+    """Returns (strong etag, mimetype) for a stored screenshot or variant, cached per file version."""
+    stat = os.stat(file_path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = screenshot_info_cache.get(file_path)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    if CONTENT_ADDRESSED_NAME.match(stem):
+        etag = stem
+    else:
+        # Uploads from before content addressing: hash the bytes once
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        etag = digest.hexdigest()
+    info = (etag, detect_mimetype(file_path))
+    screenshot_info_cache[file_path] = (key, info)
+    return info
+
+def send_screenshot(file_path):
+    """Sends a stored screenshot with immutable caching, conditional GET and Range support."""
+    etag, mimetype = screenshot_info(file_path)
+    if SENDFILE_MODE == 'x-accel':
+        response = Response(mimetype=mimetype)
+        relative_path = os.path.relpath(file_path, app.config['UPLOAD_FOLDER']).replace(os.sep, '/')
+        response.headers['X-Accel-Redirect'] = X_ACCEL_PREFIX + relative_path
+        response.set_etag(etag)
+        response.last_modified = os.path.getmtime(file_path)
+        response.cache_control.max_age = SCREENSHOT_MAX_AGE
+        # nginx serves the body (and any Range); only a 304 is decided here
+        response.make_conditional(request)
+    else:
+        # send_file answers If-None-Match/If-Modified-Since with 304 and Range with 206,
+        # and only sets X-Sendfile when USE_X_SENDFILE is on. It resolves relative paths
+        # against the app's root, but uploads are stored relative to the working directory.
+        response = send_file(os.path.abspath(file_path), mimetype=mimetype, etag=etag, conditional=True, max_age=SCREENSHOT_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+def hash_upload(file):
+    """Reads an upload in chunks, hashing as it goes. Returns (sha256 hex digest, chunks).
+
+    The chunks stay in memory (MAX_FILE_SIZE bounds them) so a duplicate
+    image is never written to disk at all.
+    """
+    digest = hashlib.sha256()
+    chunks = []
+    for chunk in iter(lambda: file.stream.read(UPLOAD_CHUNK_SIZE), b''):
+        digest.update(chunk)
+        chunks.append(chunk)
+    return digest.hexdigest(), chunks
+
+def screenshot_filename(digest, original_filename):
+    """Content-addressed name: identical uploads share one file whatever they were called.
+    The extension is taken from the raw name allowed_file() checked: secure_filename()
+    turns 'фото.png' into 'png'."""
+    ext = original_filename.rsplit('.', 1)[1].lower()
+    return f"{digest}.{'jpg' if ext == 'jpeg' else ext}"
+
+def write_screenshot(filepath, chunks):
+    temp_path = filepath + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.writelines(chunks)
+    os.replace(temp_path, filepath)
+
+def remove_screenshot_file(screenshot_path):
+    """Deletes a stored screenshot and its cached variants."""
+    filename = os.path.basename(screenshot_path)
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    if os.path.exists(file_path):
+        os.remove(file_path)
+    remove_thumbnails(filename)
+
+def collect_screenshots():
+    """Deletes screenshots whose last reference was just removed (deleted, replaced or cleared)."""
+    try:
+        database.collect_screenshots(remove_screenshot_file)
+    except Exception as e:
+        # Not fatal: the file is only orphaned
+        app.logger.warning(f"Error removing unreferenced screenshots: {e}")
+
 # --- SCREENSHOT ENDPOINTS ---
 
 @app.route('/media/<int:media_id>/screenshot', methods=['POST'])
 def upload_screenshot(media_id):
     """Upload a screenshot for a media item."""
+    include, error = parse_include()
+    if error:
+        return jsonify({'error': error}), 400
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'No file part in request'}), 400
@@ -50,16 +352,30 @@ def upload_screenshot(media_id):
         if not database.get_media_by_id(media_id):
             return jsonify({'error': f'Media item with ID {media_id} not found'}), 404
         
-        # Save file with secure name
-        filename = secure_filename(f"media_{media_id}_{file.filename}")
+        digest, chunks = hash_upload(file)
+        filename = screenshot_filename(digest, file.filename)
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        # Store relative path in database
         screenshot_path = f"screenshots/{filename}"
-        database.update_media_screenshot(media_id, screenshot_path)
+
+        # Holding the write lock keeps collect_screenshots() from removing the
+        # file between the existence check and the new reference.
+        with database.exclusive():
+            if not os.path.exists(filepath):
+                write_screenshot(filepath, chunks)
+            database.update_media_screenshot(media_id, screenshot_path)
+            body = add_included({'message': 'Screenshot uploaded successfully', 'screenshot_path': screenshot_path},
+                                media_id, include)
+        # The screenshot this one replaced may now be unreferenced
+        collect_screenshots()
+
+        try:
+            for size in THUMBNAIL_SIZES:
+                make_thumbnail(filepath, size)
+        except Exception as e:
+            # Not fatal: the variants are retried on first request, or the original is served
+            app.logger.warning(f"Could not create thumbnails for {filename}: {e}")
         
-        return jsonify({'message': 'Screenshot uploaded successfully', 'screenshot_path': screenshot_path}), 201
+        return jsonify(body), 201
     
     except Exception as e:
         app.logger.error(f"Error uploading screenshot: {e}")
@@ -81,14 +397,16 @@ def get_screenshot_info(media_id):
 @app.route('/media/<int:media_id>/screenshot', methods=['DELETE'])
 def delete_screenshot(media_id):
     """Delete the screenshot for a media item."""
+    include, error = parse_include()
+    if error:
+        return jsonify({'error': error}), 400
     try:
-        screenshot_path = database.get_media_screenshot(media_id)
-        
-        if screenshot_path and os.path.exists(screenshot_path):
-            os.remove(screenshot_path)
-        
-        database.remove_media_screenshot(media_id)
-        return jsonify({'message': 'Screenshot deleted successfully'}), 200
+        # The file itself goes once no other media item shares it
+        with database.exclusive():
+            database.remove_media_screenshot(media_id)
+            body = add_included({'message': 'Screenshot deleted successfully'}, media_id, include)
+        collect_screenshots()
+        return jsonify(body), 200
     
     except Exception as e:
         app.logger.error(f"Error deleting screenshot: {e}")
@@ -96,11 +414,24 @@ def delete_screenshot(media_id):
 
 @app.route('/screenshot/<path:filename>', methods=['GET'])
 def serve_screenshot(filename):
-    """Serve a screenshot file."""
+    """Serve a screenshot file, or with ?size= one of its THUMBNAIL_SIZES variants."""
     try:
+        size = request.args.get('size', type=int)
+        if size is not None and size not in THUMBNAIL_SIZES:
+            return jsonify({'error': f'size must be one of: {", ".join(map(str, THUMBNAIL_SIZES))}'}), 400
+
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(filename))
         if os.path.exists(file_path):
-            return send_file(file_path, mimetype='image/png')
+            if size is not None:
+                try:
+                    thumb_path = make_thumbnail(file_path, size)
+                except Exception as e:
+                    # Serve the original instead, as upload_screenshot promises
+                    app.logger.error(f"Could not create thumbnail of {filename} at size {size}: {e}")
+                    thumb_path = None
+                if thumb_path:
+                    return send_screenshot(thumb_path)
+            return send_screenshot(file_path)
         else:
             return jsonify({'error': 'Screenshot not found'}), 404
     except Exception as e:
@@ -116,10 +447,36 @@ def serve_index():
     return send_from_directory('.', 'index.html')
 @app.route('/media', methods=['GET'])
 def list_all_media():
+    """Lists all media, or one page of it with ?limit=N[&after_id=ID]; ?fields=a,b limits the keys returned."""
+    fields, error = parse_fields(request.args.get('fields'))
+    if error:
+        return jsonify({'error': error}), 400
+
+    limit = request.args.get('limit')
+    after_id = request.args.get('after_id')
+    if limit is not None and (not limit.isdigit() or not 1 <= int(limit) <= MAX_PAGE_SIZE):
+        return jsonify({'error': f'limit must be an integer between 1 and {MAX_PAGE_SIZE}'}), 400
+    if after_id is not None and not after_id.isdigit():
+        return jsonify({'error': 'after_id must be a media ID'}), 400
+
     try:
-        media_db = database.get_all_media()
-        media_list = [media_to_json(id, data) for id, data in media_db.items()]
-        return jsonify(media_list)
+        if limit is None and after_id is None and wants_stream():
+            return versioned(lambda: stream_media(database.iter_media(), fields))
+
+        if limit is None and after_id is None:
+            def build_list():
+                media_db = database.get_all_media()
+                return [media_to_json(id, data, fields) for id, data in media_db.items()]
+            return versioned_json(build_list)
+
+        def build_page():
+            page_size = int(limit) if limit is not None else MAX_PAGE_SIZE
+            media_db, next_after_id = database.get_media_page(page_size, int(after_id) if after_id is not None else None)
+            return {
+                'items': [media_to_json(id, data, fields) for id, data in media_db.items()],
+                'next_after_id': next_after_id
+            }
+        return versioned_json(build_page)
     except Exception as e:
         app.logger.error(f"Error listing all media: {e}")
         return jsonify({"error": "Internal server error occurred while fetching media."}), 500
@@ -128,31 +485,30 @@ def list_all_media():
 @app.route('/media/category/<category>', methods=['GET'])
 def list_media_by_category(category):
     try:
-        media_db = database.get_all_media()
-        category_media = [
-            media_to_json(id, data)
-            for id, data in media_db.items()
-            if data['category'].lower() == category.lower()
-        ]
-        return jsonify(category_media)
+        def build_category_list():
+            media_db = database.get_media_by_category(category)
+            return [media_to_json(id, data) for id, data in media_db.items()]
+        return versioned_json(build_category_list)
     except Exception as e:
         app.logger.error(f"Error listing media by category: {e}")
         return jsonify({"error": "Internal server error occurred while filtering media."}), 500
 
-# 3. Search for media items with a specific name (exact match)
+# 3. Search for media items with a specific name (exact match, optional ?limit=)
 @app.route('/media/search', methods=['GET'])
 def search_media_by_name():
     name_to_search = request.args.get('name')
     if not name_to_search:
         return jsonify({'error': 'Name parameter is required for search'}), 400
 
+    limit = request.args.get('limit')
+    if limit is not None:
+        if not limit.isdigit() or int(limit) < 1:
+            return jsonify({'error': 'Limit must be a positive integer'}), 400
+        limit = int(limit)
+
     try:
-        media_db = database.get_all_media()
-        found_media = []
-        for id, data in media_db.items():
-            if data['name'].lower() == name_to_search.lower():
-                found_media.append(media_to_json(id, data))
-                break 
+        media_db = database.find_media_by_name(name_to_search, limit)
+        found_media = [media_to_json(id, data) for id, data in media_db.items()]
 
         if found_media:
             return jsonify(found_media)
@@ -162,6 +518,81 @@ def search_media_by_name():
         app.logger.error(f"Error searching media: {e}")
         return jsonify({"error": "Internal server error occurred during search."}), 500
 
+# 3b. Ranked full-text search across name and author, tolerant of typos
+@app.route('/media/query', methods=['GET'])
+def query_media():
+    query_text = request.args.get('q', '').strip()
+    if not query_text:
+        return jsonify({'error': 'q parameter is required for query'}), 400
+
+    k = request.args.get('k', str(DEFAULT_QUERY_RESULTS))
+    if not k.isdigit() or not 1 <= int(k) <= MAX_QUERY_RESULTS:
+        return jsonify({'error': f'k must be an integer between 1 and {MAX_QUERY_RESULTS}'}), 400
+
+    try:
+        results = []
+        for id, data, score in database.query_media(query_text, int(k)):
+            item = media_to_json(id, data)
+            item['score'] = round(score, 4)
+            results.append(item)
+        return jsonify(results)
+    except Exception as e:
+        app.logger.error(f"Error querying media: {e}")
+        return jsonify({"error": "Internal server error occurred during query."}), 500
+
+# 3c. Delta feed for client-side replicas
+@app.route('/media/changes', methods=['GET'])
+def list_media_changes():
+    """Records created, updated or deleted since ?since=<version> (the "version" of an earlier call).
+
+    {"reset": true} means the version is unknown or too old: reload the whole
+    catalog, then ask for changes since the returned version.
+    """
+    try:
+        changes = database.get_changes(request.args.get('since', ''))
+        body = {
+            'version': changes['version'],
+            'reset': changes['reset'],
+            'updated': [media_to_json(media_id, media) for media_id, media in changes['updated'].items()],
+            'deleted': changes['deleted']
+        }
+        if changes['favorite_ids'] is not None:
+            body['favorite_ids'] = changes['favorite_ids']
+        return jsonify(body), 200
+    except Exception as e:
+        app.logger.error(f"Error fetching media changes: {e}")
+        return jsonify({"error": "Internal server error occurred while fetching changes."}), 500
+
+# 3d. Everything the desk app shows at startup, in one round trip
+@app.route('/dashboard', methods=['GET'])
+def get_dashboard():
+    """The first page of media (?limit=N, ?fields=a,b), the favorite ids and statistics.
+
+    All three come from one snapshot of the store; "version" is the token to
+    pass to /media/changes for anything newer.
+    """
+    fields, error = parse_fields(request.args.get('fields'))
+    if error:
+        return jsonify({'error': error}), 400
+    limit = request.args.get('limit', str(MAX_PAGE_SIZE))
+    if not limit.isdigit() or not 1 <= int(limit) <= MAX_PAGE_SIZE:
+        return jsonify({'error': f'limit must be an integer between 1 and {MAX_PAGE_SIZE}'}), 400
+
+    try:
+        def build_dashboard():
+            dashboard = database.get_dashboard(int(limit))
+            return {
+                'version': dashboard['version'],
+                'items': [media_to_json(id, data, fields) for id, data in dashboard['media'].items()],
+                'next_after_id': dashboard['next_after_id'],
+                'favorite_ids': dashboard['favorite_ids'],
+                'stats': dashboard['stats']
+            }
+        return versioned_json(build_dashboard)
+    except Exception as e:
+        app.logger.error(f"Error building dashboard: {e}")
+        return jsonify({"error": "Internal server error occurred while fetching the dashboard."}), 500
+
 # 4. Display the metadata of a specific media item (READ ONE)
 @app.route('/media/<int:media_id>', methods=['GET'])
 def get_media_metadata(media_id):
@@ -178,9 +609,12 @@ def get_media_metadata(media_id):
 # 5. Create a new media item (CREATE)
 @app.route('/media', methods=['POST'])
 def create_new_media():
-    required_fields = ['name', 'publication_date', 'author', 'category']
+    required_fields = database.REQUIRED_FIELDS
     if not request.json or not all(key in request.json for key in required_fields):
         return jsonify({'error': f'Missing required fields: {", ".join(required_fields)}'}), 400
+    include, error = parse_include()
+    if error:
+        return jsonify({'error': error}), 400
 
     try:
         new_media = {
@@ -190,18 +624,54 @@ def create_new_media():
             'category': request.json['category'] 
         }
 
-        media_id = database.create_media(new_media)
-        return jsonify({'message': 'Media item created successfully', 'id': media_id}), 201
+        with database.exclusive():
+            media_id = database.create_media(new_media)
+            body = add_included({'message': 'Media item created successfully', 'id': media_id}, media_id, include)
+        return jsonify(body), 201
     except Exception as e:
         app.logger.error(f"Error creating new media: {e}")
         return jsonify({"error": "Internal server error occurred while creating media."}), 500
 
+# 5b. Apply many create/update/delete/favorite operations in one request
+@app.route('/media/batch', methods=['POST'])
+def batch_media():
+    """Body: {"operations": [{"op": ..., "id": ..., "data": {...}}, ...], "atomic": false}."""
+    payload = request.get_json(silent=True)
+    operations = payload.get('operations') if isinstance(payload, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'Body must be a JSON object with a non-empty "operations" list'}), 400
+    if len(operations) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'A batch may contain at most {MAX_BATCH_SIZE} operations'}), 400
+    atomic = payload.get('atomic', False)
+    if not isinstance(atomic, bool):
+        return jsonify({'error': '"atomic" must be true or false'}), 400
+
+    try:
+        applied, results = database.apply_batch(operations, atomic)
+        if applied:
+            collect_screenshots()
+        succeeded = sum(1 for result in results if result['ok'])
+        body = {
+            'applied': applied,
+            'atomic': atomic,
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'results': results
+        }
+        return jsonify(body), 200 if applied else 409
+    except Exception as e:
+        app.logger.error(f"Error applying batch: {e}")
+        return jsonify({"error": "Internal server error occurred while applying batch."}), 500
+
 # 6. Update an existing media item (UPDATE / EDIT)
 @app.route('/media/<int:media_id>', methods=['PUT'])
 def update_media_item(media_id):
-    required_fields = ['name', 'publication_date', 'author', 'category']
+    required_fields = database.REQUIRED_FIELDS
     if not request.json or not all(key in request.json for key in required_fields):
         return jsonify({'error': f'Missing required fields in payload: {", ".join(required_fields)}'}), 400
+    include, error = parse_include()
+    if error:
+        return jsonify({'error': error}), 400
     
     try:
         updated_data = {
@@ -211,10 +681,11 @@ def update_media_item(media_id):
             'category': request.json['category'] 
         }
 
-        if database.update_media(media_id, updated_data):
-            return jsonify({'message': f'Media item with ID {media_id} updated successfully'}), 200
-        else:
-            return jsonify({'error': f'Media item with ID {media_id} not found'}), 404
+        with database.exclusive():
+            if not database.update_media(media_id, updated_data):
+                return jsonify({'error': f'Media item with ID {media_id} not found'}), 404
+            body = add_included({'message': f'Media item with ID {media_id} updated successfully'}, media_id, include)
+        return jsonify(body), 200
     except Exception as e:
         app.logger.error(f"Error updating media item: {e}")
         return jsonify({"error": "Internal server error occurred while updating media."}), 500
@@ -222,11 +693,16 @@ def update_media_item(media_id):
 # 7. Delete a specific media item (DELETE)
 @app.route('/media/<int:media_id>', methods=['DELETE'])
 def delete_media_item(media_id):
+    include, error = parse_include()
+    if error:
+        return jsonify({'error': error}), 400
     try:
-        if database.delete_media(media_id):
-            return jsonify({'message': f'Media item with ID {media_id} deleted successfully'}), 200
-        else:
-            return jsonify({'error': f'Media item with ID {media_id} not found'}), 404
+        with database.exclusive():
+            if not database.delete_media(media_id):
+                return jsonify({'error': f'Media item with ID {media_id} not found'}), 404
+            body = add_included({'message': f'Media item with ID {media_id} deleted successfully'}, media_id, include)
+        collect_screenshots()
+        return jsonify(body), 200
     except Exception as e:
         app.logger.error(f"Error deleting media item: {e}")
         return jsonify({"error": "Internal server error occurred while deleting media."}), 500
@@ -236,15 +712,19 @@ def delete_media_item(media_id):
 def list_favorites():
     """Returns a list of all media items that are marked as favorites."""
     try:
-        favorite_ids = database.get_favorites()
-        media_db = database.get_all_media()
-        
-        favorite_list = []
-        for media_id in favorite_ids:
-            if media_id in media_db:
-                favorite_list.append(media_to_json(media_id, media_db[media_id]))
-        
-        return jsonify(favorite_list)
+        def iter_favorites():
+            # One lookup per favorite keeps this O(favorites) regardless of catalog size
+            for media_id in database.get_favorites():
+                media_data = database.get_media_by_id(media_id)
+                if media_data is not None:
+                    yield media_id, media_data
+
+        if wants_stream():
+            return versioned(lambda: stream_media(iter_favorites()))
+
+        def build_favorite_list():
+            return [media_to_json(media_id, media_data) for media_id, media_data in iter_favorites()]
+        return versioned_json(build_favorite_list)
     except Exception as e:
         app.logger.error(f"Error listing favorites: {e}")
         return jsonify({"error": "Internal server error occurred while fetching favorites."}), 500
@@ -261,11 +741,15 @@ def get_favorite_ids():
 @app.route('/favorites/add/<int:media_id>', methods=['POST'])
 def add_favorite_item(media_id):
     """Adds a media item to the favorites list."""
+    include, error = parse_include()
+    if error:
+        return jsonify({'error': error}), 400
     try:
-        if database.add_favorite(media_id):
-            return jsonify({'message': f'Media item {media_id} added to favorites'}), 200
-        else:
-            return jsonify({'error': 'Media item not found or already a favorite'}), 404
+        with database.exclusive():
+            if not database.add_favorite(media_id):
+                return jsonify({'error': 'Media item not found or already a favorite'}), 404
+            body = add_included({'message': f'Media item {media_id} added to favorites'}, media_id, include)
+        return jsonify(body), 200
     except Exception as e:
         app.logger.error(f"Error adding favorite: {e}")
         return jsonify({"error": "Internal server error."}), 500
@@ -273,11 +757,15 @@ def add_favorite_item(media_id):
 @app.route('/favorites/remove/<int:media_id>', methods=['POST'])
 def remove_favorite_item(media_id):
     """Removes a media item from the favorites list."""
+    include, error = parse_include()
+    if error:
+        return jsonify({'error': error}), 400
     try:
-        if database.remove_favorite(media_id):
-            return jsonify({'message': f'Media item {media_id} removed from favorites'}), 200
-        else:
-            return jsonify({'error': 'Media item was not in favorites'}), 404
+        with database.exclusive():
+            if not database.remove_favorite(media_id):
+                return jsonify({'error': 'Media item was not in favorites'}), 404
+            body = add_included({'message': f'Media item {media_id} removed from favorites'}, media_id, include)
+        return jsonify(body), 200
     except Exception as e:
         app.logger.error(f"Error removing favorite: {e}")
         return jsonify({"error": "Internal server error."}), 500
@@ -287,18 +775,44 @@ def remove_favorite_item(media_id):
 def get_statistics():
     """Returns overall media statistics."""
     try:
-        stats = database.get_media_statistics()
-        return jsonify(stats)
+        return versioned_json(database.get_media_statistics)
     except Exception as e:
         app.logger.error(f"Error fetching statistics: {e}")
         return jsonify({"error": "Internal server error occurred while fetching statistics."}), 500
 
 
+# --- LIVE EVENTS ENDPOINT ---
+@app.route('/events', methods=['GET'])
+def stream_events():
+    """Server-Sent Events: one event per mutation, as published by database.py.
+
+    Each event's id is the store version after the change, so a client can
+    check it applied every event in order and otherwise resync via /media/changes.
+    """
+    subscription = database.subscribe()
+
+    def generate():
+        try:
+            # Sent at once so clients know the stream is live (and can sync up from there)
+            yield "event: hello\ndata: {}\n\n"
+            while True:
+                event = subscription.get(timeout=EVENT_HEARTBEAT)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\nid: {event['version']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            database.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 # Run the Flask app
 if __name__ == '__main__':
     try:
         print("--- Starting Flask Backend Server ---")
-        if 'database' not in sys.modules or database.db_store is None:
+        if 'database' not in sys.modules or (database.db_store is None and database.sql_store is None):
              print("ERROR: database.py module could not be imported or initialized.")
              database.load_data()
         
@@ -0,0 +1,804 @@
+# benchmark.py - Reproducible benchmarks for the Library Desk backend
+import argparse
+import base64
+import collections
+import http.client
+import json
+import logging
+import math
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+
+# Point the database at a throwaway file BEFORE importing it, so benchmarks
+# never touch the real media_data.json.
+BENCH_DIR = tempfile.mkdtemp(prefix='library_bench_')
+os.environ['LIBRARY_DATA_FILE'] = os.path.join(BENCH_DIR, 'media_data.json')
+os.environ['LIBRARY_WRITE_BEHIND'] = '0'
+
+import database
+from search_index import SearchIndex, tokenize
+from tree_rows import TreeRows
+
+CATEGORIES = ['Book', 'Film', 'Magazine']
+WORDS = ['the', 'last', 'star', 'river', 'night', 'code', 'garden', 'empire', 'silent', 'ocean',
+         'shadow', 'winter', 'king', 'machine', 'city', 'dream', 'fire', 'glass', 'road', 'storm']
+AUTHORS = ['Andy Weir', 'Christopher Nolan', 'Frank Herbert', 'Ursula Le Guin', 'Ted Chiang',
+           'Octavia Butler', 'Denis Villeneuve', 'Agatha Christie', 'Isaac Asimov', 'Greta Gerwig']
+
+
+# --- Helpers ---
+def make_media(rng, index):
+    """Builds one synthetic media record."""
+    return {
+        'name': ' '.join(rng.choice(WORDS) for _ in range(3)) + f' {index}',
+        'publication_date': f'{rng.randint(1900, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+        'author': rng.choice(AUTHORS),
+        'category': rng.choice(CATEGORIES),
+        'screenshot': None
+    }
+
+def reset_store(items, seed=42):
+    """Replaces the benchmark store with a synthetic catalog and reloads it from disk."""
+    rng = random.Random(seed)
+    if database.sql_store is not None:
+        database.sql_store.close()
+        database.sql_store = None
+    sqlite_file = database.SQLITE_FILE
+    for path in (database.DATA_FILE, database.JOURNAL_FILE, database.GENERATION_FILE,
+                 sqlite_file, sqlite_file + '-wal', sqlite_file + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+    catalog = {"media": {i: make_media(rng, i) for i in range(1, items + 1)}, "favorites": []}
+    database.save_data(catalog)
+    database.load_data()
+
+def timed(func, repeat):
+    """Runs func `repeat` times and returns the mean seconds per call."""
+    start = time.perf_counter()
+    for i in range(repeat):
+        func(i)
+    return (time.perf_counter() - start) / repeat
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (Linux reports ru_maxrss in KB)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def misspell(rng, word):
+    """Replaces one inner character of word to simulate a typo."""
+    if len(word) < 3:
+        return word
+    i = rng.randint(1, len(word) - 2)
+    return word[:i] + rng.choice('aeioursnt') + word[i + 1:]
+
+class FakeTreeview:
+    """The slice of the ttk.Treeview API that the frontend uses, counting every widget call."""
+
+    def __init__(self):
+        self.rows = collections.deque()
+        self.values = {}
+        self.calls = 0
+        self.next_iid = 0
+        self.selected = ()
+
+    def get_children(self):
+        self.calls += 1
+        return tuple(self.rows)
+
+    def insert(self, parent, index, iid=None, values=()):
+        self.calls += 1
+        if iid is None:
+            self.next_iid += 1
+            iid = f'I{self.next_iid}'
+        if index == 'end':
+            self.rows.append(iid)
+        else:
+            self.rows.insert(index, iid)
+        self.values[iid] = values
+        return iid
+
+    def delete(self, *iids):
+        self.calls += 1
+        for iid in iids:
+            self.rows.remove(iid)
+            del self.values[iid]
+
+    def move(self, iid, parent, index):
+        self.calls += 1
+        self.rows.remove(iid)
+        self.rows.insert(index, iid)
+
+    def item(self, iid, values):
+        self.calls += 1
+        self.values[iid] = values
+
+    def selection(self):
+        return self.selected
+
+    def selection_set(self, iid):
+        self.calls += 1
+        self.selected = (iid,)
+
+    def yview(self):
+        return 0.0, 1.0
+
+    def yview_moveto(self, fraction):
+        self.calls += 1
+
+def rebuild_treeview(tree, media_list):
+    """The old update_treeview: delete every row, then reinsert all with a strptime per row."""
+    for item in tree.get_children():
+        tree.delete(item)
+    for media in media_list:
+        try:
+            year = datetime.strptime(media.get('publication_date', ''), '%Y-%m-%d').year
+        except ValueError:
+            year = 'N/A'
+        tree.insert('', 'end', values=(media['id'], year, media['category'], media['name']))
+
+def print_table(headers, rows):
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print('  '.join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print('  '.join(str(c).ljust(w) for c, w in zip(row, widths)))
+
+
+# --- Benchmarks ---
+def bench_durability(args):
+    """Per-write cost of every STORAGE_MODE / DURABILITY combination."""
+    rows = []
+    for mode in ('snapshot', 'journal'):
+        for level in ('none', 'atomic', 'fsync'):
+            database.STORAGE_MODE = mode
+            database.DURABILITY = level
+            reset_store(args.items)
+            per_write = timed(lambda i: database.update_media(1 + i % args.items, {'name': f'Renamed {i}'}), args.writes)
+            rows.append((mode, level, f'{per_write * 1000:.3f}', f'{1 / per_write:,.0f}'))
+    print(f"Durability benchmark: {args.items} items, {args.writes} writes per configuration")
+    print_table(('storage', 'durability', 'ms/write', 'writes/s'), rows)
+
+
+def bench_search(args):
+    """Build and query cost of the /media/query index versus a linear substring scan."""
+    rng = random.Random(7)
+    catalog = {i: make_media(rng, i) for i in range(1, args.items + 1)}
+
+    rss_before = peak_rss_mb()
+    index = SearchIndex()
+    start = time.perf_counter()
+    for media_id, media in catalog.items():
+        index.add(media_id, media)
+    build_seconds = time.perf_counter() - start
+    print(f"Search benchmark: {args.items:,} items")
+    print(f"index build: {build_seconds:.2f} s, peak RSS growth: {peak_rss_mb() - rss_before:,.0f} MB")
+
+    intended = [rng.choice(WORDS) for _ in range(args.queries)]
+    query_sets = {
+        'single word': [rng.choice(WORDS) for _ in range(args.queries)],
+        'author': [rng.choice(AUTHORS) for _ in range(args.queries)],
+        'two words': [f'{rng.choice(WORDS)} {rng.choice(WORDS)}' for _ in range(args.queries)],
+        'typo': [misspell(rng, word) for word in intended],
+        'id token': [str(rng.randint(1, args.items)) for _ in range(args.queries)],
+    }
+    rows = []
+    for label, queries in query_sets.items():
+        per_query = timed(lambda i: index.query(queries[i], args.k), len(queries))
+        hit_rate = '-'
+        if label == 'typo':
+            # Share of queries with an item containing the intended word in the top k
+            hits = sum(any(word in tokenize(f"{catalog[media_id]['name']} {catalog[media_id]['author']}")
+                           for media_id, _ in index.query(typo, args.k))
+                       for word, typo in zip(intended, queries))
+            hit_rate = f'{hits / len(queries):.0%}'
+        rows.append((label, f'{per_query * 1000:.2f}', f'{1 / per_query:,.0f}', hit_rate))
+
+    # The scan a substring search on top of /media/search would need; a few queries are enough.
+    scan_queries = query_sets['single word'][:5]
+    def scan(i):
+        needle = scan_queries[i]
+        return [media_id for media_id, media in catalog.items()
+                if needle in media['name'].lower() or needle in media['author'].lower()]
+    per_scan = timed(scan, len(scan_queries))
+    rows.append(('linear scan', f'{per_scan * 1000:.2f}', f'{1 / per_scan:,.1f}', '-'))
+    print_table(('query', 'ms/query', 'queries/s', 'hit rate'), rows)
+
+
+def bench_batch(args):
+    """POST /media/batch versus one POST /media (create_new_media) per record."""
+    os.chdir(BENCH_DIR)  # backend creates its screenshots folder in the working directory
+    import backend
+    client = backend.app.test_client()
+    rng = random.Random(11)
+    records = [make_media(rng, i) for i in range(args.records)]
+    for record in records:
+        del record['screenshot']
+
+    rows = []
+    for mode in ('snapshot', 'journal'):
+        database.STORAGE_MODE = mode
+
+        reset_store(args.items)
+        start = time.perf_counter()
+        for record in records:
+            client.post('/media', json=record)
+        single = time.perf_counter() - start
+
+        reset_store(args.items)
+        start = time.perf_counter()
+        operations = [{'op': 'create', 'data': record} for record in records]
+        for i in range(0, len(operations), backend.MAX_BATCH_SIZE):
+            client.post('/media/batch', json={'operations': operations[i:i + backend.MAX_BATCH_SIZE]})
+        batched = time.perf_counter() - start
+
+        rows.append((mode, 'POST /media x N', f'{single:.2f}', f'{args.records / single:,.0f}'))
+        rows.append((mode, 'POST /media/batch', f'{batched:.2f}', f'{args.records / batched:,.0f}'))
+    print(f"Batch benchmark: {args.records:,} creates into a {args.items:,} item catalog")
+    print_table(('storage', 'path', 'seconds', 'records/s'), rows)
+
+
+def bench_treeview(args):
+    """Frontend list refresh: full rebuild versus diffed, windowed TreeRows (no GUI needed)."""
+    rng = random.Random(11)
+    rows = []
+    for size in args.sizes:
+        media_list = [dict(make_media(rng, i), id=i) for i in range(1, size + 1)]
+        edited = list(media_list)
+        edited[0] = dict(edited[0], name='Renamed')
+        created = media_list + [dict(make_media(rng, size + 1), id=size + 1)]
+        deleted = media_list[1:]
+        scenarios = (('initial render', media_list), ('one record edited', edited),
+                     ('one record created', created), ('first record deleted', deleted))
+
+        naive_tree, diff_tree = FakeTreeview(), FakeTreeview()
+        tree_rows = TreeRows(diff_tree)
+        for label, new_list in scenarios:
+            calls = naive_tree.calls
+            naive = timed(lambda i: rebuild_treeview(naive_tree, new_list), 1)
+            naive_calls = naive_tree.calls - calls
+            calls = diff_tree.calls
+            diffed = timed(lambda i: tree_rows.show(new_list), 1)
+            diff_calls = diff_tree.calls - calls
+            rows.append((f'{size:,}', label, f'{naive * 1000:.1f}', f'{naive_calls:,}',
+                         f'{diffed * 1000:.2f}', f'{diff_calls:,}'))
+        # Dragging the scrollbar to the bottom moves the window there
+        calls = diff_tree.calls
+        scrolled = timed(lambda i: tree_rows.yview('moveto', 1.0), 1)
+        rows.append((f'{size:,}', 'scroll to end', '-', '-', f'{scrolled * 1000:.2f}', f'{diff_tree.calls - calls:,}'))
+        if list(diff_tree.rows) != [str(media['id']) for media in deleted[-tree_rows.window:]]:
+            print(f"FAIL: rows out of order after diffing {size:,} items")
+            sys.exit(1)
+    print("Treeview benchmark: Python-side cost; each widget call costs extra in Tk")
+    print_table(('items', 'update', 'rebuild ms', 'rebuild calls', 'TreeRows ms', 'TreeRows calls'), rows)
+
+
+def consistency_errors():
+    """Compares every derived structure in database.py against a fresh scan of the store."""
+    errors = []
+    # Read one snapshot throughout: in multi-process mode other processes may still be
+    # writing (SQLite commits straight to the shared file), so hold their lock too
+    with database.store_lock.write(), database.process_lock(exclusive=False):
+        if database.MULTI_PROCESS:
+            database.sync_from_disk()
+        try:
+            database.get_media_statistics(check=True)
+        except RuntimeError as e:
+            errors.append(str(e))
+        media = database.get_all_media()
+        if len(database.search_index) != len(media):
+            errors.append(f'search index holds {len(database.search_index)} items, store holds {len(media)}')
+        if not database.sql_store:
+            if database.sorted_ids != sorted(media):
+                errors.append('sorted id index out of sync')
+            for category in {item['category'] for item in media.values()}:
+                expected = sorted(i for i, item in media.items() if item['category'].casefold() == category.casefold())
+                if sorted(database.get_media_by_category(category)) != expected:
+                    errors.append(f'category index out of sync for {category!r}')
+        if any(media_id not in media for media_id in database.get_favorites()):
+            errors.append('favorites reference deleted items')
+    return errors
+
+def bench_stress(args):
+    """Hammers create/update/delete/favorite and reads from many threads, then checks consistency."""
+    database.STORAGE_ENGINE = args.engine
+    database.STORAGE_MODE = 'journal'
+    reset_store(args.items)
+    created_ids = []
+    failures = []
+
+    def writer(seed):
+        rng = random.Random(seed)
+        try:
+            for i in range(args.ops):
+                action = rng.random()
+                media_id = rng.randint(1, args.items + args.threads * args.ops)
+                if action < 0.4:
+                    created_ids.append(database.create_media(make_media(rng, i)))
+                elif action < 0.7:
+                    database.update_media(media_id, {'name': f'Renamed {seed}-{i}', 'category': rng.choice(CATEGORIES)})
+                elif action < 0.85:
+                    database.delete_media(media_id)
+                elif action < 0.95:
+                    database.add_favorite(media_id)
+                else:
+                    database.remove_favorite(media_id)
+        except Exception as e:
+            failures.append(f'writer {seed}: {e!r}')
+
+    def reader(seed):
+        rng = random.Random(seed)
+        try:
+            for i in range(args.ops):
+                if i % 10 == 0:
+                    sum(1 for _ in database.iter_media(chunk_size=100))
+                database.get_media_statistics()
+                database.get_media_by_category(rng.choice(CATEGORIES))
+                database.query_media(rng.choice(WORDS), 10)
+                for media_id in database.get_favorites():
+                    database.get_media_by_id(media_id)
+        except Exception as e:
+            failures.append(f'reader {seed}: {e!r}')
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(args.threads)]
+    threads += [threading.Thread(target=reader, args=(1000 + i,)) for i in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    if len(set(created_ids)) != len(created_ids):
+        failures.append(f'{len(created_ids) - len(set(created_ids))} duplicate ids allocated')
+    failures += consistency_errors()
+    database.load_data()
+    failures += [f'after reload: {error}' for error in consistency_errors()]
+
+    total_ops = 2 * args.threads * args.ops
+    print(f"Stress test ({args.engine}): {args.threads} writer + {args.threads} reader threads, "
+          f"{total_ops:,} operations in {elapsed:.2f} s ({total_ops / elapsed:,.0f} ops/s)")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("FAILED" if failures else "OK: store, indexes and counters are consistent")
+    if failures:
+        sys.exit(1)
+
+
+def process_worker(seed, ops, items, results):
+    """One worker process of bench_processes: a mix of writes and reads against the shared files."""
+    rng = random.Random(seed)
+    created = []
+    for i in range(ops):
+        action = rng.random()
+        media_id = rng.randint(1, items)
+        if action < 0.4:
+            created.append(database.create_media(make_media(rng, i)))
+        elif action < 0.6:
+            database.update_media(media_id, {'name': f'Renamed {seed}-{i}'})
+        elif action < 0.7:
+            database.delete_media(media_id)
+        elif action < 0.8:
+            database.add_favorite(media_id)
+        else:
+            database.get_media_statistics()
+            database.get_media_by_id(media_id)
+    results.put((created, consistency_errors(), database.changes_version()))
+
+def bench_processes(args):
+    """Several processes sharing one store (LIBRARY_MULTI_PROCESS), then checks every view agrees."""
+    database.MULTI_PROCESS = True
+    database.STORAGE_ENGINE = args.engine
+    database.STORAGE_MODE = 'journal'
+    reset_store(args.items)
+
+    start_version = database.changes_version()
+    start_media = database.get_all_media()
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    workers = [context.Process(target=process_worker, args=(seed, args.ops, args.items, results))
+               for seed in range(args.processes)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    outcomes = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    failures = [f'worker: {error}' for _, worker_errors, _ in outcomes for error in worker_errors]
+    created_ids = [media_id for created, _, _ in outcomes for media_id in created]
+    if len(set(created_ids)) != len(created_ids):
+        failures.append(f'{len(created_ids) - len(set(created_ids))} ids allocated by more than one process')
+
+    # This process made no writes: its first read must pick up everything incrementally
+    start_sync = time.perf_counter()
+    synced = database.get_all_media()
+    sync_seconds = time.perf_counter() - start_sync
+    failures += consistency_errors()
+
+    # Change tokens mean the same in every process: one handed out by a worker (or by
+    # this process before the run) resolves here item by item, journal compactions included
+    for token in [start_version] + [version for _, _, version in outcomes]:
+        if database.get_changes(token)['reset']:
+            failures.append(f'changes since {token} from another process came back as a reset')
+    changes = database.get_changes(start_version)
+    replayed = {media_id: media for media_id, media in start_media.items() if media_id not in changes['deleted']}
+    replayed.update(changes['updated'])
+    if replayed != synced:
+        failures.append('changes since the start of the run do not add up to the synced store')
+    per_check = timed(lambda i: database.get_media_by_id(1), 1000)
+    database.load_data()
+    if database.get_all_media() != synced:
+        failures.append('incremental sync differs from a full reload')
+
+    total_ops = args.processes * args.ops
+    print(f"Multi-process test ({args.engine}): {args.processes} processes, "
+          f"{total_ops:,} operations in {elapsed:.2f} s ({total_ops / elapsed:,.0f} ops/s)")
+    print(f"catch-up after {total_ops:,} foreign operations: {sync_seconds * 1000:.1f} ms, "
+          f"read with unchanged generation: {per_check * 1e6:.1f} us")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("FAILED" if failures else "OK: every process sees the same store")
+    if failures:
+        sys.exit(1)
+
+
+# --- Load Test (every backend route) ---
+class TestClientTransport:
+    """Requests through Flask's test client: the app's own cost, no sockets."""
+    name = 'test_client'
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, content_type=None):
+        response = self.client.open(path, method=method, data=body, content_type=content_type)
+        data = response.get_data()
+        response.close()
+        return response.status_code, data
+
+    def first_event(self, path):
+        response = self.client.get(path, buffered=False)
+        status = response.status_code
+        next(iter(response.response))
+        response.close()  # closes the stream's generator, which unsubscribes
+        return status
+
+    def close(self):
+        pass
+
+class HttpTransport:
+    """Requests over a keep-alive HTTP connection to a real server on a local port."""
+    name = 'http'
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)  # no access log per request
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.connection = http.client.HTTPConnection('127.0.0.1', self.server.server_port)
+
+    def request(self, method, path, body=None, content_type=None):
+        headers = {'Content-Type': content_type} if content_type else {}
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        return response.status, response.read()
+
+    def first_event(self, path):
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.server_port)
+        connection.request('GET', path)
+        response = connection.getresponse()
+        while response.fp.readline().strip():
+            pass
+        connection.close()
+        return response.status
+
+    def close(self):
+        self.connection.close()
+        self.server.shutdown()
+
+TRANSPORTS = {'test_client': TestClientTransport, 'http': HttpTransport}
+
+# A 1x1 PNG for the screenshot routes
+SCREENSHOT_PNG = base64.b64decode('iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==')
+EVENT_REQUESTS = 20  # each HTTP /events stream holds a server thread until its next heartbeat
+
+def multipart_file(field, filename, content):
+    """Encodes one file upload as multipart/form-data. Returns (body, content type)."""
+    boundary = 'library-bench-boundary'
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n').encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+def json_body(payload):
+    return json.dumps(payload).encode(), 'application/json'
+
+def load_endpoints(rng, items):
+    """(label, expected status, request, check) for every backend route, in run order.
+
+    request(i) returns (method, path, body, content type), or None once there
+    is nothing left to send; None instead of a function means the /events
+    stream, timed up to its first event. check(body) returns False if a
+    response with the expected status still reports a failure.
+
+    The per-item write routes work on the items POST /media created, which
+    DELETE /media/<id> removes again, so the catalog keeps its size. Items are
+    picked with rng, so runs are repeatable.
+    """
+    created = []
+    uploaded = []
+    names = [database.get_media_by_id(rng.randint(1, items))['name'] for _ in range(50)]
+
+    def random_id(i):
+        return rng.randint(1, items)
+
+    def created_id(i):
+        return created[i % len(created)]
+
+    def record(i):
+        return {key: value for key, value in make_media(rng, i).items() if key in database.REQUIRED_FIELDS}
+
+    def create(i):
+        return ('POST', '/media') + json_body(record(items + i))
+
+    def update(i):
+        media_id = random_id(i)
+        return ('PUT', f'/media/{media_id}') + json_body(record(media_id))
+
+    def batch(i):
+        operations = []
+        for _ in range(10):
+            media_id = random_id(i)
+            operations.append({'op': 'update', 'id': media_id, 'data': record(media_id)})
+        return ('POST', '/media/batch') + json_body({'operations': operations})
+
+    def upload(i):
+        return ('POST', f'/media/{created_id(i)}/screenshot') + multipart_file('file', 'cover.png', SCREENSHOT_PNG)
+
+    def delete(i):
+        # Each created item exactly once
+        return ('DELETE', f'/media/{created[i]}', None, None) if i < len(created) else None
+
+    def get(path):
+        return lambda i: ('GET', path(i), None, None)
+
+    def post(path):
+        return lambda i: ('POST', path(i), None, None)
+
+    def remember_created(body):
+        created.append(json.loads(body)['id'])
+        return True
+
+    def remember_upload(body):
+        uploaded.append(json.loads(body)['screenshot_path'].rsplit('/', 1)[-1])
+        return True
+
+    def batch_succeeded(body):
+        return json.loads(body)['failed'] == 0
+
+    return [
+        ('GET /', 200, get(lambda i: '/'), None),
+        ('GET /media', 200, get(lambda i: '/media'), None),
+        ('GET /media?stream=1', 200, get(lambda i: '/media?stream=1'), None),
+        ('GET /media?limit=100', 200, get(lambda i: f'/media?limit=100&after_id={random_id(i)}'), None),
+        ('GET /media/category/<category>', 200, get(lambda i: f'/media/category/{CATEGORIES[i % len(CATEGORIES)]}'), None),
+        ('GET /media/search', 200, get(lambda i: f'/media/search?name={urllib.parse.quote(names[i % len(names)])}'), None),
+        ('GET /media/query', 200, get(lambda i: f'/media/query?q={rng.choice(WORDS)}+{rng.choice(WORDS)}'), None),
+        ('GET /media/changes', 200, get(lambda i: f'/media/changes?since={database.changes_version()}'), None),
+        ('GET /dashboard', 200, get(lambda i: '/dashboard?limit=500'), None),
+        ('GET /media/<id>', 200, get(lambda i: f'/media/{random_id(i)}'), None),
+        ('GET /stats', 200, get(lambda i: '/stats'), None),
+        ('POST /media', 201, create, remember_created),
+        ('PUT /media/<id>', 200, update, None),
+        ('POST /media/batch', 200, batch, batch_succeeded),
+        ('POST /favorites/add/<id>', 200, post(lambda i: f'/favorites/add/{created_id(i)}'), None),
+        ('GET /favorites', 200, get(lambda i: '/favorites'), None),
+        ('GET /favorites/ids', 200, get(lambda i: '/favorites/ids'), None),
+        ('POST /favorites/remove/<id>', 200, post(lambda i: f'/favorites/remove/{created_id(i)}'), None),
+        ('POST /media/<id>/screenshot', 201, upload, remember_upload),
+        ('GET /media/<id>/screenshot', 200, get(lambda i: f'/media/{created_id(i)}/screenshot'), None),
+        ('GET /screenshot/<name>', 200, get(lambda i: f'/screenshot/{uploaded[0]}'), None),
+        ('GET /screenshot/<name>?size=128', 200, get(lambda i: f'/screenshot/{uploaded[0]}?size=128'), None),
+        ('DELETE /media/<id>/screenshot', 200, lambda i: ('DELETE', f'/media/{created_id(i)}/screenshot', None, None), None),
+        ('DELETE /media/<id>', 200, delete, None),
+        ('GET /events', 200, None, None),
+    ]
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+def run_endpoint(transport, endpoint, requests, max_seconds):
+    """Sends up to `requests` requests (fewer if max_seconds runs out). Returns one result row."""
+    label, expected, make_request, check = endpoint
+    latencies = []
+    errors = 0
+    rss_before = peak_rss_mb()
+    deadline = time.perf_counter() + max_seconds
+    for i in range(requests if make_request else min(requests, EVENT_REQUESTS)):
+        request = make_request(i) if make_request else None
+        if make_request and request is None:
+            break
+        start = time.perf_counter()
+        if request is None:
+            status, body = transport.first_event('/events'), b''
+        else:
+            status, body = transport.request(*request)
+        latencies.append(time.perf_counter() - start)
+        if status != expected or (check and not check(body)):
+            errors += 1
+        if time.perf_counter() > deadline:
+            break
+    latencies.sort()
+    elapsed = sum(latencies)
+    return {
+        'endpoint': label,
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        # ru_maxrss only grows: the process peak so far, and how much this endpoint raised it
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'rss_growth_mb': round(peak_rss_mb() - rss_before, 1)
+    }
+
+def bench_load(args):
+    """Latency, throughput and peak RSS of every backend route over growing synthetic catalogs."""
+    output = os.path.abspath(args.output)
+    shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'index.html'), BENCH_DIR)
+    os.chdir(BENCH_DIR)  # backend creates its screenshots folder in the working directory
+    import backend
+    database.STORAGE_ENGINE = args.engine
+    database.STORAGE_MODE = args.storage
+
+    results = []
+    for items in args.sizes:
+        for transport_name in args.transports:
+            start = time.perf_counter()
+            reset_store(items, args.seed)
+            print(f"{items:,} items ({transport_name}): catalog generated in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+            transport = TRANSPORTS[transport_name](backend.app)
+            try:
+                for endpoint in load_endpoints(random.Random(args.seed), items):
+                    row = run_endpoint(transport, endpoint, args.requests, args.max_seconds)
+                    results.append(dict(row, catalog_size=items, transport=transport_name))
+                    print(f"  {row['endpoint']:34} p50 {row['p50_ms']:9.2f} ms  p99 {row['p99_ms']:9.2f} ms  "
+                          f"{row['requests']:5} requests, {row['errors']} errors", file=sys.stderr)
+            finally:
+                transport.close()
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'config': {'engine': args.engine, 'storage': args.storage, 'durability': database.DURABILITY,
+                   'requests': args.requests, 'max_seconds': args.max_seconds, 'seed': args.seed},
+        'results': results
+    }
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Load test: {len(results)} results written to {output}")
+    if any(row['errors'] for row in results):
+        print("FAIL: some requests returned an unexpected status")
+        sys.exit(1)
+
+
+COMPARED_METRICS = (('p50_ms', 1), ('p95_ms', 1), ('p99_ms', 1), ('throughput_rps', -1), ('peak_rss_mb', 1))
+
+def bench_compare(args):
+    """Flags endpoints whose latency, throughput or peak RSS regressed between two `load` reports."""
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    def key(row):
+        return row['catalog_size'], row['transport'], row['endpoint']
+    baseline_rows = {key(row): row for row in baseline['results']}
+
+    rows = []
+    regressions = 0
+    for row in current['results']:
+        before = baseline_rows.pop(key(row), None)
+        if before is None:
+            rows.append((f"{row['catalog_size']:,}", row['transport'], row['endpoint'], '-', 'new'))
+            continue
+        for metric, direction in COMPARED_METRICS:
+            old, new = before.get(metric), row.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            # Sub-threshold latency differences are noise, whatever their ratio
+            if metric.endswith('_ms') and abs(new - old) < args.min_delta_ms:
+                continue
+            if change * direction > args.threshold:
+                regressions += 1
+                rows.append((f"{row['catalog_size']:,}", row['transport'], row['endpoint'], metric,
+                             f'{old:g} -> {new:g} ({change:+.0%})'))
+    for size, transport, endpoint in baseline_rows:
+        rows.append((f'{size:,}', transport, endpoint, '-', 'missing'))
+
+    print(f"Compared {len(current['results'])} results against {args.baseline} "
+          f"(threshold {args.threshold:.0%}, latency noise floor {args.min_delta_ms} ms)")
+    if rows:
+        print_table(('items', 'transport', 'endpoint', 'metric', 'change'), rows)
+    print(f"FAILED: {regressions} regressions" if regressions else "OK: no regressions")
+    if regressions:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Library Desk benchmarks')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    durability = subparsers.add_parser('durability', help=bench_durability.__doc__)
+    durability.add_argument('--items', type=int, default=10000)
+    durability.add_argument('--writes', type=int, default=200)
+    durability.set_defaults(func=bench_durability)
+
+    search = subparsers.add_parser('search', help=bench_search.__doc__)
+    search.add_argument('--items', type=int, default=1000000)
+    search.add_argument('--queries', type=int, default=200)
+    search.add_argument('-k', type=int, default=20)
+    search.set_defaults(func=bench_search)
+
+    batch = subparsers.add_parser('batch', help=bench_batch.__doc__)
+    batch.add_argument('--items', type=int, default=10000)
+    batch.add_argument('--records', type=int, default=1000)
+    batch.set_defaults(func=bench_batch)
+
+    stress = subparsers.add_parser('stress', help=bench_stress.__doc__)
+    stress.add_argument('--engine', choices=('json', 'sqlite'), default='json')
+    stress.add_argument('--items', type=int, default=1000)
+    stress.add_argument('--threads', type=int, default=8)
+    stress.add_argument('--ops', type=int, default=500)
+    stress.set_defaults(func=bench_stress)
+
+    processes = subparsers.add_parser('processes', help=bench_processes.__doc__)
+    processes.add_argument('--engine', choices=('json', 'sqlite'), default='json')
+    processes.add_argument('--items', type=int, default=1000)
+    processes.add_argument('--processes', type=int, default=4)
+    processes.add_argument('--ops', type=int, default=500)
+    processes.set_defaults(func=bench_processes)
+
+    treeview = subparsers.add_parser('treeview', help=bench_treeview.__doc__)
+    treeview.add_argument('--sizes', type=lambda s: [int(n) for n in s.split(',')], default=[1000, 10000, 100000])
+    treeview.set_defaults(func=bench_treeview)
+
+    load = subparsers.add_parser('load', help=bench_load.__doc__)
+    load.add_argument('--sizes', type=lambda s: [int(n) for n in s.split(',')], default=[1000, 10000, 100000],
+                      help='comma-separated catalog sizes, e.g. 1000,10000,100000,1000000')
+    load.add_argument('--transports', type=lambda s: s.split(','), default=list(TRANSPORTS),
+                      help='comma-separated: test_client, http')
+    load.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    load.add_argument('--max-seconds', type=float, default=5.0, help='time budget per endpoint')
+    load.add_argument('--engine', choices=('json', 'sqlite'), default=database.STORAGE_ENGINE)
+    load.add_argument('--storage', choices=('snapshot', 'journal'), default=database.STORAGE_MODE)
+    load.add_argument('--seed', type=int, default=42)
+    load.add_argument('--output', default='load_results.json')
+    load.set_defaults(func=bench_load)
+
+    compare = subparsers.add_parser('compare', help=bench_compare.__doc__)
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=0.10, help='relative change that counts as a regression')
+    compare.add_argument('--min-delta-ms', type=float, default=0.1, help='ignore smaller latency differences')
+    compare.set_defaults(func=bench_compare)
+
+    args = parser.parse_args()
+    try:
+        args.func(args)
+    finally:
+        shutil.rmtree(BENCH_DIR, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+# bulk_io.py - Streaming bulk import/export of media records (NDJSON or CSV)
+#
+#   python bulk_io.py import legacy_catalog.csv
+#   python bulk_io.py export - --format ndjson > catalog.ndjson
+#
+# Records are read and written one at a time. Imported records get their ids
+# from database.py and the store is persisted once, after the last row (in
+# journal mode, once per IMPORT_BATCH_SIZE rows).
+import argparse
+import contextlib
+import csv
+import itertools
+import json
+import sys
+import time
+
+import database
+
+FORMATS = ('ndjson', 'csv')
+EXPORT_COLUMNS = ('id',) + database.REQUIRED_FIELDS + ('screenshot',)
+MAX_REPORTED_ERRORS = 10
+# Rows created per database.batch() in journal mode, where a batch holds back one
+# journal record per row
+IMPORT_BATCH_SIZE = 5000
+
+
+def detect_format(path, requested):
+    if requested:
+        return requested
+    if path.lower().endswith('.csv'):
+        return 'csv'
+    return 'ndjson'
+
+def open_stream(path, mode):
+    """Opens path for text I/O; '-' means stdin/stdout (which are left open)."""
+    if path == '-':
+        return contextlib.nullcontext(sys.stdin if 'r' in mode else sys.stdout)
+    return open(path, mode, newline='', encoding='utf-8')
+
+def read_records(stream, file_format):
+    """Yields (record, error) pairs one at a time without loading the whole input."""
+    if file_format == 'csv':
+        for row in csv.DictReader(stream):
+            yield row, None
+        return
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield None, f'Invalid JSON: {e}'
+            continue
+        yield record, None
+
+def validate_record(record):
+    """Same rule as create_new_media: every required field must be present.
+
+    A field must also have a value: csv fills the cells missing from a short row
+    with None, and a row of empty cells is no record at all.
+    """
+    if not isinstance(record, dict):
+        return 'Record must be a JSON object'
+    missing = [key for key in database.REQUIRED_FIELDS if record.get(key) is None]
+    if missing:
+        return f'Missing required fields: {", ".join(missing)}'
+    if all(not str(record[key]).strip() for key in database.REQUIRED_FIELDS):
+        return 'Empty record'
+    return None
+
+def import_groups(rows):
+    """Splits the rows into the groups imported by one database.batch() each.
+
+    Only journal mode needs bounded groups; in snapshot mode every batch rewrites
+    the whole catalog, so the import is a single batch that persists once.
+    """
+    if database.sql_store or database.STORAGE_MODE != 'journal':
+        yield rows
+        return
+    while True:
+        group = list(itertools.islice(rows, IMPORT_BATCH_SIZE))
+        if not group:
+            return
+        yield group
+
+def import_records(path, file_format):
+    imported = 0
+    errors = []
+    start = time.perf_counter()
+    with open_stream(path, 'r') as stream:
+        rows = enumerate(read_records(stream, file_format), start=1)
+        for group in import_groups(rows):
+            with database.batch():
+                for row_number, (record, error) in group:
+                    error = error or validate_record(record)
+                    if error:
+                        errors.append((row_number, error))
+                        continue
+                    database.create_media({key: record[key] for key in database.REQUIRED_FIELDS})
+                    imported += 1
+    elapsed = time.perf_counter() - start
+
+    for row_number, error in errors[:MAX_REPORTED_ERRORS]:
+        print(f"Row {row_number}: {error}", file=sys.stderr)
+    if len(errors) > MAX_REPORTED_ERRORS:
+        print(f"... and {len(errors) - MAX_REPORTED_ERRORS} more invalid rows", file=sys.stderr)
+    print(f"Imported {imported} records ({len(errors)} skipped) in {elapsed:.2f} s, "
+          f"{imported / elapsed if elapsed else 0:,.0f} rows/s", file=sys.stderr)
+    return 1 if errors else 0
+
+def export_records(path, file_format):
+    exported = 0
+    start = time.perf_counter()
+    with open_stream(path, 'w') as stream:
+        if file_format == 'csv':
+            writer = csv.DictWriter(stream, fieldnames=EXPORT_COLUMNS, extrasaction='ignore')
+            writer.writeheader()
+            for media_id, media in database.iter_media():
+                writer.writerow(dict(media, id=media_id))
+                exported += 1
+        else:
+            for media_id, media in database.iter_media():
+                stream.write(json.dumps(dict(media, id=media_id)) + '\n')
+                exported += 1
+    elapsed = time.perf_counter() - start
+    print(f"Exported {exported} records in {elapsed:.2f} s, "
+          f"{exported / elapsed if elapsed else 0:,.0f} rows/s", file=sys.stderr)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import/export of Library Desk media records')
+    parser.add_argument('action', choices=('import', 'export'))
+    parser.add_argument('path', help="file to read or write, or '-' for stdin/stdout")
+    parser.add_argument('--format', choices=FORMATS, help='defaults to csv for *.csv paths, otherwise ndjson')
+    args = parser.parse_args()
+
+    file_format = detect_format(args.path, args.format)
+    if args.action == 'import':
+        return import_records(args.path, file_format)
+    return export_records(args.path, file_format)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,66 @@
 # database.py - Updated with Statistics Function
+import atexit
+import bisect
+import collections
+import contextlib
+import functools
+import itertools
 import json
 import os
+import queue
+import threading
+import uuid
 from datetime import datetime
+try:
+    import fcntl
+except ImportError:  # Windows: multi-process mode is unavailable
+    fcntl = None
+from search_index import SearchIndex
+from sqlite_store import SQLiteStore
 
-DATA_FILE = 'media_data.json'
+# Fields every media item must have (create and update payloads)
+REQUIRED_FIELDS = ('name', 'publication_date', 'author', 'category')
+BATCH_OPERATIONS = ('create', 'update', 'delete', 'favorite', 'unfavorite')
+
+DATA_FILE = os.environ.get('LIBRARY_DATA_FILE', 'media_data.json')
+JOURNAL_FILE = os.path.splitext(DATA_FILE)[0] + '.journal'
+SQLITE_FILE = os.environ.get('LIBRARY_SQLITE_FILE', os.path.splitext(DATA_FILE)[0] + '.sqlite3')
+
+# 'json' keeps the catalog in memory and persists it to DATA_FILE (the settings
+# below apply to it); 'sqlite' stores it in SQLITE_FILE, seeded from DATA_FILE on first run.
+STORAGE_ENGINE = os.environ.get('LIBRARY_STORAGE_ENGINE', 'json')
+
+# 'none' truncates DATA_FILE in place; 'atomic' writes a temp file and renames
+# it over DATA_FILE; 'fsync' also fsyncs the file, its directory and journal appends.
+DURABILITY = os.environ.get('LIBRARY_DURABILITY', 'atomic')
+
+# 'snapshot' rewrites DATA_FILE on every change; 'journal' appends each change
+# to JOURNAL_FILE and only rewrites DATA_FILE when the journal is compacted.
+STORAGE_MODE = os.environ.get('LIBRARY_STORAGE_MODE', 'snapshot')
+COMPACT_AFTER = 1000  # journal records kept before the snapshot is rewritten
+
+# Write-behind: mutations only queue their change and a background thread
+# persists them at most every FLUSH_INTERVAL seconds, or sooner once
+# FLUSH_MAX_PENDING changes are waiting. Pending changes are flushed at exit.
+WRITE_BEHIND = os.environ.get('LIBRARY_WRITE_BEHIND', '0') == '1'
+FLUSH_INTERVAL = 1.0
+FLUSH_MAX_PENDING = 500
+
+# Multi-process: several worker processes (e.g. `gunicorn -w 4 backend:app`)
+# share the same files. Every mutation holds an exclusive lock on LOCK_FILE and
+# advances the generation number in GENERATION_FILE by one per change; reads
+# compare that number with the one this process last saw and, if another process
+# has written since, replay only the new journal records (SQLite: re-index the
+# items listed in its changes table).
+# Implies the 'journal' storage mode and no write-behind.
+MULTI_PROCESS = os.environ.get('LIBRARY_MULTI_PROCESS', '0') == '1'
+LOCK_FILE = os.path.splitext(DATA_FILE)[0] + '.lock'
+GENERATION_FILE = os.path.splitext(DATA_FILE)[0] + '.generation'
+if MULTI_PROCESS:
+    if fcntl is None:
+        raise RuntimeError("LIBRARY_MULTI_PROCESS needs fcntl file locks, which this platform lacks")
+    STORAGE_MODE = 'journal'
+    WRITE_BEHIND = False
 
 # Initial data structure remains the same
 INITIAL_MEDIA_DATA = {
@@ -41,143 +98,1132 @@ INITIAL_MEDIA_DATA = {
 }
 
 db_store = None
+sql_store = None
 next_id = 1
 
+# Incremented by every mutation. store_epoch is regenerated by load_data so
+# versions from before a restart or reload never match the current store.
+# In multi-process mode the version is the generation from GENERATION_FILE and
+# the epoch is fixed, so every worker process hands out the same tokens for the
+# same store, before and after journal compactions.
+store_version = 0
+store_epoch = uuid.uuid4().hex[:8]
+
+# Recent mutations as (store_version, 'media' | 'favorite', media_id), oldest
+# first, so clients holding a replica can fetch just what changed. Versions
+# from change_log_start on are fully covered.
+CHANGE_LOG_SIZE = 10000
+change_log = collections.deque(maxlen=CHANGE_LOG_SIZE)
+change_log_start = 0
+
+# Live listeners (e.g. /events clients). Each gets its own bounded queue, so a
+# slow one never blocks writers: if it falls behind, its backlog is replaced
+# by a single reset event.
+EVENT_QUEUE_SIZE = 1000
+subscribers = set()
+subscribers_lock = threading.Lock()
+
+# Secondary indexes over db_store["media"] (JSON engine only):
+# case-folded key -> {media_id: None}, i.e. an insertion-ordered id set.
+category_index = {}
+name_index = {}
+# Ascending media ids for keyset pagination (JSON engine; SQLite uses its primary key)
+sorted_ids = []
+
+# Per-category item counts kept current by the mutation functions, so
+# get_media_statistics() is O(number of categories) for both engines.
+category_counts = {}
+
+# Number of media items referencing each screenshot path. Uploads are stored
+# by content hash, so identical images share one file; paths whose count
+# dropped to zero wait in unreferenced_screenshots for collect_screenshots().
+screenshot_refs = {}
+unreferenced_screenshots = set()
+
+# Recompute statistics from scratch on every call and fail loudly if the
+# counters have drifted (meant for tests and debugging).
+CHECK_STATISTICS = os.environ.get('LIBRARY_CHECK_STATISTICS', '0') == '1'
+
+# Ranked full-text index over name/author. SQLite has no equivalent here, so
+# it is kept in memory for both engines.
+search_index = SearchIndex()
+# SQLite engine: (category, screenshot) each item was indexed with, so an item
+# another process changed can be unindexed without its old record
+indexed_fields = {}
+journal_length = 0
+# Bytes of JOURNAL_FILE already applied to db_store (where an incremental replay resumes)
+journal_offset = 0
+# True when the journal ends in a torn record past journal_offset, to be cut off before the next append
+journal_torn = False
+
+# (generation, compactions) from GENERATION_FILE as of this process's last sync
+# with the other processes; None outside multi-process mode.
+seen_generation = None
+process_lock_depth = 0
+
+pending_entries = []
+pending_changes = 0
+pending_lock = threading.Lock()
+write_lock = threading.Lock()
+flush_wakeup = threading.Event()
+flusher_stop = threading.Event()
+flusher_thread = None
+
+# Journal records collected while a batch() runs; None outside a batch.
+batch_entries = None
+
+# --- Locking ---
+class ReadWriteLock:
+    """Lets many readers in at once but writers only one at a time, and alone.
+
+    Waiting writers block new readers so writes are not starved. A thread that
+    holds the write lock may re-enter either side, and a reading thread may
+    re-enter the read side.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.readers = 0
+        self.writer = None
+        self.write_depth = 0
+        self.waiting_writers = 0
+        self.local = threading.local()
+
+    @contextlib.contextmanager
+    def read(self):
+        me = threading.get_ident()
+        depth = getattr(self.local, 'read_depth', 0)
+        if self.writer != me and depth == 0:
+            with self.condition:
+                while self.writer is not None or self.waiting_writers:
+                    self.condition.wait()
+                self.readers += 1
+        self.local.read_depth = depth + 1
+        try:
+            yield
+        finally:
+            self.local.read_depth = depth
+            if self.writer != me and depth == 0:
+                with self.condition:
+                    self.readers -= 1
+                    if not self.readers:
+                        self.condition.notify_all()
+
+    @contextlib.contextmanager
+    def write(self):
+        me = threading.get_ident()
+        with self.condition:
+            if self.writer != me:
+                self.waiting_writers += 1
+                while self.writer is not None or self.readers:
+                    self.condition.wait()
+                self.waiting_writers -= 1
+                self.writer = me
+            self.write_depth += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.write_depth -= 1
+                if not self.write_depth:
+                    self.writer = None
+                    self.condition.notify_all()
+
+    def held(self):
+        """True if the calling thread holds either side of the lock."""
+        return self.writer == threading.get_ident() or getattr(self.local, 'read_depth', 0) > 0
+
+# Guards db_store, the indexes and counters: public read functions share it,
+# mutations hold it exclusively.
+store_lock = ReadWriteLock()
+
+@contextlib.contextmanager
+def exclusive():
+    """Holds the store for a mutation.
+
+    In multi-process mode the outermost holder also takes the inter-process
+    lock, catches up with other processes first and publishes a new generation
+    afterwards if anything changed.
+    """
+    with store_lock.write():
+        if not MULTI_PROCESS or store_lock.write_depth > 1:
+            yield
+            return
+        with process_lock(exclusive=True):
+            sync_from_disk()
+            version = store_version
+            try:
+                yield
+            finally:
+                if store_version != version:
+                    publish_generation(version)
+
+def reads(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if MULTI_PROCESS:
+            refresh_from_disk()
+        with store_lock.read():
+            return func(*args, **kwargs)
+    return wrapper
+
+def writes(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with exclusive():
+            return func(*args, **kwargs)
+    return wrapper
+
+# --- Multi-Process Coordination ---
+@contextlib.contextmanager
+def process_lock(exclusive):
+    """Holds LOCK_FILE shared or exclusively in multi-process mode (a no-op otherwise).
+
+    Only taken while holding store_lock for writing, so a plain counter is
+    enough to let nested callers through.
+    """
+    global process_lock_depth
+    if not MULTI_PROCESS or process_lock_depth:
+        process_lock_depth += 1
+        try:
+            yield
+        finally:
+            process_lock_depth -= 1
+        return
+
+    with open(LOCK_FILE, 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        process_lock_depth = 1
+        try:
+            yield
+        finally:
+            process_lock_depth = 0
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def read_generation():
+    """Returns (generation, compactions) from GENERATION_FILE; (0, 0) before the first write."""
+    try:
+        with open(GENERATION_FILE, 'r') as f:
+            generation, compactions = f.read().split()
+        return int(generation), int(compactions)
+    except (FileNotFoundError, ValueError):
+        return 0, 0
+
+def write_generation(generation):
+    """Atomically replaces GENERATION_FILE, so readers never see a partial number."""
+    global seen_generation
+    temp_file = GENERATION_FILE + '.tmp'
+    with open(temp_file, 'w') as f:
+        f.write(f"{generation[0]} {generation[1]}\n")
+    os.replace(temp_file, GENERATION_FILE)
+    seen_generation = generation
+
+def publish_generation(version):
+    """Announces this process's mutations (those after store_version `version`) to the others.
+
+    Store versions are generation numbers in this mode, so each mutation's
+    version is also its generation; SQLite also records which item each one changed.
+    """
+    global journal_offset
+    if sql_store:
+        changes = itertools.takewhile(lambda change: change[0] > version, reversed(change_log))
+        sql_store.record_changes(version, list(changes)[::-1], CHANGE_LOG_SIZE)
+    write_generation((store_version, seen_generation[1]))
+    journal_offset = os.path.getsize(JOURNAL_FILE) if os.path.exists(JOURNAL_FILE) else 0
+
+def sync_from_disk():
+    """Applies whatever other processes wrote since this one last synced.
+
+    Only the journal records appended since then are replayed, and each change
+    is logged under the version its writer gave it; a full reload is needed only
+    after another process compacted the journal. Call with store_lock held for
+    writing and LOCK_FILE held.
+    """
+    global seen_generation
+    generation = read_generation()
+    if generation == seen_generation:
+        return
+    if sql_store:
+        # SQLite already sees the other processes' commits; only the in-memory indexes are stale
+        changes = sync_sqlite_indexes(seen_generation, generation)
+    elif seen_generation is None:
+        load_json()
+        changes = None
+    elif generation[1] != seen_generation[1]:
+        # Another process compacted the journal past this one's offset
+        reload_json(generation[0])
+        seen_generation = generation
+        return
+    else:
+        changes = replay_journal(journal_offset)
+    seen_generation = generation
+    if changes is None or store_version + len(changes) != generation[0]:
+        reset_change_log(generation)
+        return
+    for kind, media_id in changes:
+        bump_version(media_id, kind)
+
+def reload_json(version):
+    """Reloads the JSON store after another process compacted the journal.
+
+    The journal records this process hadn't replayed are gone, so the changes
+    are found by comparing the old store with the reloaded one and all logged
+    at version, which covers every token from before it.
+    """
+    global store_version
+    old_media, old_favorites = db_store["media"], db_store["favorites"]
+    load_json()
+    media, favorites = db_store["media"], db_store["favorites"]
+    changes = [('media', media_id) for media_id in old_media.keys() | media.keys()
+               if old_media.get(media_id) != media.get(media_id)]
+    changes += [('favorite', media_id) for media_id in old_favorites.keys() ^ favorites.keys()]
+    store_version = version
+    for kind, media_id in changes:
+        log_change(media_id, kind)
+
+def sync_sqlite_indexes(seen, generation):
+    """Re-indexes the SQLite items changed between generations seen and generation
+    and returns those changes as (kind, media_id), oldest first.
+
+    Falls back to a full rebuild (returning None) when the changes table doesn't
+    cover that range.
+    """
+    rows = sql_store.get_changes(seen[0]) if seen is not None else None
+    if seen is None or [row[0] for row in rows] != list(range(seen[0] + 1, generation[0] + 1)):
+        rebuild_indexes()
+        return None
+    for media_id in dict.fromkeys(media_id for _, kind, media_id in rows if kind == 'media'):
+        fields = indexed_fields.get(media_id)
+        if fields is not None:
+            unindex_media(media_id, {'category': fields[0], 'screenshot': fields[1]})
+        media = sql_store.get_media_by_id(media_id)
+        if media is not None:
+            index_media(media_id, media)
+    return [(kind, media_id) for _, kind, media_id in rows]
+
+def refresh_from_disk():
+    """Brings this process up to date before a read; costs one small file read when nothing changed."""
+    if read_generation() == seen_generation or store_lock.held():
+        return
+    with store_lock.write(), process_lock(exclusive=False):
+        sync_from_disk()
+
+def load_sqlite():
+    """Opens the SQLite engine, importing the JSON snapshot (or the initial data) into an empty database."""
+    global sql_store
+    if sql_store is not None:
+        sql_store.close()
+    sql_store = SQLiteStore(SQLITE_FILE)
+    if sql_store.is_empty():
+        sql_store.import_data(read_seed_data())
+    rebuild_indexes()
+
+def read_seed_data():
+    """Returns the JSON snapshot (or the initial data) used to seed an empty SQLite database."""
+    seed = INITIAL_MEDIA_DATA
+    if os.path.exists(DATA_FILE):
+        try:
+            with open(DATA_FILE, 'r') as f:
+                data = json.load(f)
+            seed = {
+                "media": {int(k): v for k, v in data.get("media", {}).items()},
+                "favorites": [int(fav) for fav in data.get("favorites", [])]
+            }
+        except (json.JSONDecodeError, ValueError):
+            pass
+    return seed
+
 def load_data():
+    """Loads the store for the configured STORAGE_ENGINE."""
+    global sql_store, store_epoch, store_version, seen_generation, change_log_start
+    with store_lock.write(), process_lock(exclusive=False):
+        store_epoch = uuid.uuid4().hex[:8]
+        change_log.clear()
+        change_log_start = store_version
+        if STORAGE_ENGINE == 'sqlite':
+            load_sqlite()
+        else:
+            if sql_store is not None:
+                sql_store.close()
+                sql_store = None
+            load_json()
+        if MULTI_PROCESS:
+            seen_generation = read_generation()
+            store_epoch = 'mp'
+            store_version = change_log_start = seen_generation[0]
+
+def load_json():
     """Loads media data and favorites from the JSON file and safely calculates next_id."""
     global next_id, db_store
-    
     if not os.path.exists(DATA_FILE):
-        db_store = INITIAL_MEDIA_DATA.copy()
-        db_store["media"] = INITIAL_MEDIA_DATA["media"].copy()
-        db_store["favorites"] = []
-        next_id = max(db_store["media"].keys()) + 1 if db_store["media"] else 1
-        save_data(db_store)
+        load_initial_data()
         return
 
     try:
         with open(DATA_FILE, 'r') as f:
             data = json.load(f)
-            media_data = data.get("media", {})
-            
-            # Convert string keys to integers
-            db_store = {
-                "media": {int(k): v for k, v in media_data.items()},
-                "favorites": [int(fav) if isinstance(fav, str) and fav.isdigit() else fav for fav in data.get("favorites", [])]
-            }
-            
-            if db_store["media"]:
-                next_id = max(db_store["media"].keys()) + 1
-            else:
-                next_id = 1
-            
-    except json.JSONDecodeError:
-        db_store = INITIAL_MEDIA_DATA.copy()
-        db_store["media"] = INITIAL_MEDIA_DATA["media"].copy()
-        db_store["favorites"] = []
-        next_id = max(db_store["media"].keys()) + 1 if db_store["media"] else 1
-        save_data(db_store)
-    except Exception:
-        db_store = INITIAL_MEDIA_DATA.copy()
-        db_store["media"] = INITIAL_MEDIA_DATA["media"].copy()
-        db_store["favorites"] = []
-        next_id = 1
+    except json.JSONDecodeError as e:
+        # Keep the unreadable file for recovery rather than overwrite it with the initial data
+        corrupt_file = DATA_FILE + '.corrupt'
+        os.replace(DATA_FILE, corrupt_file)
+        print(f"Error loading {DATA_FILE}: {e}. Moved it to {corrupt_file} and started from the initial data.")
+        if os.path.exists(JOURNAL_FILE):
+            # The journal's records apply to the corrupt snapshot: keep them with it
+            os.replace(JOURNAL_FILE, JOURNAL_FILE + '.corrupt')
+        load_initial_data()
+        return
+
+    # The file holds the user's catalog: a failure from here on must not swap
+    # in the seed data, or the next write would overwrite the catalog with it.
+    try:
+        media_data = data.get("media", {})
+        
+        # Convert string keys to integers
+        db_store = {
+            "media": {int(k): v for k, v in media_data.items()},
+            # Insertion-ordered set; saved back to disk as a plain list
+            "favorites": dict.fromkeys(int(fav) if isinstance(fav, str) and fav.isdigit() else fav for fav in data.get("favorites", []))
+        }
+        # Index the snapshot first; replaying the journal keeps the indexes current
+        rebuild_indexes()
+        replay_journal()
+        if journal_length and STORAGE_MODE != 'journal':
+            # Fold a journal left behind by an earlier journaled run into the snapshot.
+            compact()
+        
+        if db_store["media"]:
+            next_id = max(db_store["media"].keys()) + 1
+        else:
+            next_id = 1
+    except Exception as e:
+        print(f"Error loading {DATA_FILE}: {e}")
+        raise
+
+def load_initial_data():
+    """Starts the JSON store from INITIAL_MEDIA_DATA and saves it as DATA_FILE.
+
+    A journal without the snapshot it applies to is moved aside, so it is never
+    replayed onto the initial data (whose new ids would collide with its own).
+    """
+    global next_id, db_store, journal_length, journal_offset, journal_torn
+    if os.path.exists(JOURNAL_FILE):
+        orphaned_file = JOURNAL_FILE + '.orphaned'
+        os.replace(JOURNAL_FILE, orphaned_file)
+        print(f"{JOURNAL_FILE} has no snapshot to apply to. Moved it to {orphaned_file}.")
+    journal_length = journal_offset = 0
+    journal_torn = False
+    db_store = INITIAL_MEDIA_DATA.copy()
+    db_store["media"] = INITIAL_MEDIA_DATA["media"].copy()
+    db_store["favorites"] = {}
+    next_id = max(db_store["media"].keys()) + 1 if db_store["media"] else 1
+    save_data(db_store)
+    rebuild_indexes()
+
+def fsync_directory(path):
+    """Flushes a directory entry so a rename survives power loss (no-op where unsupported)."""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
 
 def save_data(data):
-    """Saves media data to the JSON file."""
+    """Saves media data to the JSON file using the configured DURABILITY level."""
     try:
-        with open(DATA_FILE, 'w') as f:
-            media_to_save = {str(k): v for k, v in data["media"].items()}
-            favorites_to_save = [int(fav) if isinstance(fav, int) else fav for fav in data.get("favorites", [])]
-            full_data = {"media": media_to_save, "favorites": favorites_to_save}
+        # dict()/list() copies keep the write-behind flusher safe from concurrent mutations
+        media_to_save = {str(k): dict(v) for k, v in dict(data["media"]).items()}
+        favorites_to_save = [int(fav) if isinstance(fav, int) else fav for fav in list(data.get("favorites", []))]
+        full_data = {"media": media_to_save, "favorites": favorites_to_save}
+
+        if DURABILITY == 'none':
+            with open(DATA_FILE, 'w') as f:
+                json.dump(full_data, f, indent=4)
+            return True
+
+        temp_file = DATA_FILE + '.tmp'
+        with open(temp_file, 'w') as f:
             json.dump(full_data, f, indent=4)
+            if DURABILITY == 'fsync':
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_file, DATA_FILE)
+        if DURABILITY == 'fsync':
+            fsync_directory(DATA_FILE)
+        return True
     except Exception as e:
         print(f"An error occurred while saving data: {e}")
+        return False
+
+# --- Journal Functions ---
+def apply_journal_entry(entry):
+    """Applies a single journal record to db_store, keeping the indexes and counters current.
+
+    Returns the change as (kind, media_id), as the change log records it.
+    """
+    global next_id
+    op = entry["op"]
+    media_id = entry["id"]
+    if op == "put":
+        current_data = db_store["media"].get(media_id)
+        if current_data is not None:
+            unindex_media(media_id, current_data)
+        else:
+            bisect.insort(sorted_ids, media_id)
+        db_store["media"][media_id] = entry["media"]
+        index_media(media_id, entry["media"])
+        next_id = max(next_id, media_id + 1)
+    elif op == "delete":
+        if media_id in db_store["media"]:
+            unindex_media(media_id, db_store["media"].pop(media_id))
+            del sorted_ids[bisect.bisect_left(sorted_ids, media_id)]
+        db_store["favorites"].pop(media_id, None)
+    elif op == "fav_add":
+        if media_id in db_store["media"]:
+            db_store["favorites"].setdefault(media_id, None)
+    elif op == "fav_remove":
+        db_store["favorites"].pop(media_id, None)
+    return ('favorite' if op in ("fav_add", "fav_remove") else 'media'), media_id
+
+def replay_journal(offset=0):
+    """Replays JOURNAL_FILE from byte offset onwards (0: the whole journal, on top of the loaded snapshot).
+
+    Returns the replayed changes as (kind, media_id), oldest first.
+    """
+    global journal_length, journal_offset, journal_torn
+    if not offset:
+        journal_length = 0
+    journal_offset = offset
+    journal_torn = False
+    changes = []
+    if not os.path.exists(JOURNAL_FILE):
+        return changes
+    with open(JOURNAL_FILE, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            try:
+                # Without its newline a record was cut short, even if what remains parses
+                entry = json.loads(line) if line.endswith(b'\n') else None
+            except json.JSONDecodeError:
+                entry = None
+            if entry is None:
+                # A torn final record from an interrupted append; everything before it is valid.
+                journal_torn = True
+                break
+            changes.append(apply_journal_entry(entry))
+            journal_length += 1
+            journal_offset += len(line)
+    return changes
+
+def truncate_journal():
+    """Cuts a torn final record off the journal, so the next append doesn't get glued onto it."""
+    global journal_torn
+    with open(JOURNAL_FILE, 'r+b') as f:
+        f.truncate(journal_offset)
+    journal_torn = False
+
+def compact():
+    """Rewrites the full snapshot and empties the journal."""
+    global journal_length, journal_offset, journal_torn
+    if not save_data(db_store):
+        # Keep the journal: it is the only copy of changes since the last snapshot
+        return
+    try:
+        with open(JOURNAL_FILE, 'w'):
+            pass
+        journal_length = 0
+        journal_offset = 0
+        journal_torn = False
+        if MULTI_PROCESS:
+            # Other processes can't resume from their journal offsets any more: make them reload
+            write_generation((store_version, seen_generation[1] + 1))
+    except Exception as e:
+        print(f"An error occurred while compacting the journal: {e}")
+
+def write_changes(entries):
+    """Writes a group of mutation records according to STORAGE_MODE."""
+    global journal_length
+    if STORAGE_MODE != 'journal':
+        save_data(db_store)
+        return
+
+    try:
+        if journal_torn:
+            truncate_journal()
+        with open(JOURNAL_FILE, 'a') as f:
+            f.write(''.join(json.dumps(entry) + '\n' for entry in entries))
+            if DURABILITY == 'fsync':
+                f.flush()
+                os.fsync(f.fileno())
+        journal_length += len(entries)
+    except Exception as e:
+        print(f"An error occurred while writing the journal: {e}")
+        return
+
+    if journal_length >= COMPACT_AFTER:
+        compact()
+
+def persist(op, media_id, media=None):
+    """Persists one mutation, or defers it while a batch is being applied."""
+    entry = {"op": op, "id": media_id}
+    if media is not None:
+        # Copy so later in-place updates don't alter a queued record
+        entry["media"] = dict(media)
+
+    if batch_entries is not None:
+        batch_entries.append(entry)
+        return
+    persist_entries([entry])
+
+def persist_entries(entries):
+    """Writes a group of mutation records, or queues them for the flusher in write-behind mode."""
+    global pending_changes
+    if not WRITE_BEHIND:
+        with write_lock:
+            write_changes(entries)
+        return
+
+    with pending_lock:
+        if STORAGE_MODE == 'journal':
+            pending_entries.extend(entries)
+        pending_changes += len(entries)
+        if pending_changes >= FLUSH_MAX_PENDING:
+            flush_wakeup.set()
+
+# --- Write-Behind Flusher ---
+def flush():
+    """Writes every change queued by write-behind mode in one go."""
+    global pending_entries, pending_changes
+    with write_lock:
+        with pending_lock:
+            if not pending_changes:
+                return
+            entries = pending_entries
+            pending_entries = []
+            pending_changes = 0
+        write_changes(entries)
+
+def flusher_loop():
+    while not flusher_stop.is_set():
+        flush_wakeup.wait(FLUSH_INTERVAL)
+        flush_wakeup.clear()
+        flush()
+
+def start_flusher():
+    """Starts the background flusher thread used by write-behind mode."""
+    global flusher_thread
+    if flusher_thread is not None and flusher_thread.is_alive():
+        return
+    flusher_stop.clear()
+    flusher_thread = threading.Thread(target=flusher_loop, name='database-flusher', daemon=True)
+    flusher_thread.start()
+
+def stop_flusher():
+    """Stops the flusher thread and writes anything still pending."""
+    global flusher_thread
+    if flusher_thread is not None:
+        flusher_stop.set()
+        flush_wakeup.set()
+        flusher_thread.join()
+        flusher_thread = None
+    flush()
+
+# --- Secondary Index Functions ---
+def index_key(value):
+    # Older clients could store numbers as names or categories
+    return str(value).casefold() if value is not None else ''
+
+def index_add(index, key, media_id):
+    index.setdefault(key, {})[media_id] = None
+
+def index_remove(index, key, media_id):
+    ids = index.get(key)
+    if ids is not None:
+        ids.pop(media_id, None)
+        if not ids:
+            del index[key]
+
+def stats_category(media):
+    category = media.get('category', 'Unknown')
+    return str(category) if category is not None else 'Unknown'
+
+def count_category(media, delta):
+    category = stats_category(media)
+    count = category_counts.get(category, 0) + delta
+    if count:
+        category_counts[category] = count
+    else:
+        category_counts.pop(category, None)
+
+def count_screenshot(screenshot_path, delta):
+    if not screenshot_path:
+        return
+    count = screenshot_refs.get(screenshot_path, 0) + delta
+    if count > 0:
+        screenshot_refs[screenshot_path] = count
+    else:
+        screenshot_refs.pop(screenshot_path, None)
+        unreferenced_screenshots.add(screenshot_path)
+
+def index_media(media_id, media):
+    """Adds a media item to every secondary index and the statistics counters."""
+    if sql_store:
+        indexed_fields[media_id] = (media.get('category'), media.get('screenshot'))
+    else:
+        # SQLite answers category and name lookups from its own indexes
+        index_add(category_index, index_key(media.get('category')), media_id)
+        index_add(name_index, index_key(media.get('name')), media_id)
+    search_index.add(media_id, media)
+    count_category(media, 1)
+    count_screenshot(media.get('screenshot'), 1)
+
+def unindex_media(media_id, media):
+    """Removes a media item from every secondary index and the statistics counters."""
+    if sql_store:
+        indexed_fields.pop(media_id, None)
+    else:
+        index_remove(category_index, index_key(media.get('category')), media_id)
+        index_remove(name_index, index_key(media.get('name')), media_id)
+    search_index.remove(media_id)
+    count_category(media, -1)
+    count_screenshot(media.get('screenshot'), -1)
+
+def rebuild_indexes():
+    """Rebuilds every secondary index and counter from the store in a single pass."""
+    category_index.clear()
+    name_index.clear()
+    search_index.clear()
+    indexed_fields.clear()
+    category_counts.clear()
+    screenshot_refs.clear()
+    unreferenced_screenshots.clear()
+    items = sql_store.iter_media() if sql_store else db_store["media"].items()
+    for media_id, media in items:
+        index_media(media_id, media)
+    sorted_ids[:] = [] if sql_store else sorted(db_store["media"])
 
 load_data()
+if WRITE_BEHIND:
+    start_flusher()
+atexit.register(stop_flusher)
+
+# --- Store Version ---
+def bump_version(media_id, kind='media'):
+    """Marks the store as changed and logs which item changed; called by every mutation
+    (and, in multi-process mode, for every change another process made)."""
+    global store_version
+    store_version += 1
+    log_change(media_id, kind)
+
+def log_change(media_id, kind):
+    """Logs a change under the current store_version and publishes it."""
+    global change_log_start
+    if len(change_log) == change_log.maxlen:
+        # The oldest entry is about to drop out of the log
+        change_log_start = change_log[0][0]
+    change_log.append((store_version, kind, media_id))
+    if subscribers:
+        publish(media_id, kind)
+
+def reset_change_log(generation):
+    """Restarts the change log at generation in multi-process mode, when changes
+    can't be told item by item: client replicas with an older token have to reload."""
+    global store_version, change_log_start
+    store_version = change_log_start = generation[0]
+    change_log.clear()
+    if subscribers:
+        publish()
+
+# --- Change Events ---
+class Subscription:
+    """Bounded queue of change events for one listener."""
+
+    def __init__(self, maxsize=EVENT_QUEUE_SIZE):
+        self.events = queue.Queue(maxsize)
+
+    def put(self, event):
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            # Too far behind: drop the backlog and tell the listener to resync
+            while True:
+                try:
+                    self.events.get_nowait()
+                except queue.Empty:
+                    break
+            self.events.put_nowait({"version": event["version"], "type": "reset"})
+
+    def get(self, timeout=None):
+        """Returns the next event, or None if there was none within timeout seconds."""
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+def subscribe():
+    """Starts delivering an event for every mutation to a new Subscription."""
+    subscription = Subscription()
+    with subscribers_lock:
+        subscribers.add(subscription)
+    return subscription
+
+def unsubscribe(subscription):
+    with subscribers_lock:
+        subscribers.discard(subscription)
+
+def publish(media_id=None, kind='media'):
+    """Sends the current mutation to every subscriber (called by bump_version, under the write lock).
+
+    Events: {"version", "type": "media", "id", "media": record or None if
+    deleted}, {"version", "type": "favorite", "id", "favorite": bool}, or
+    {"version", "type": "reset"} when the change isn't known item by item.
+    """
+    event = {"version": changes_version(), "type": kind if media_id is not None else "reset"}
+    if media_id is not None:
+        event["id"] = media_id
+        if kind == 'favorite':
+            event["favorite"] = sql_store.is_favorite(media_id) if sql_store else media_id in db_store["favorites"]
+        else:
+            media = sql_store.get_media_by_id(media_id) if sql_store else db_store["media"].get(media_id)
+            event["media"] = dict(media) if media is not None else None
+    with subscribers_lock:
+        listeners = list(subscribers)
+    for subscription in listeners:
+        subscription.put(event)
+
+def get_version():
+    """Returns an opaque token that changes whenever the store changes (including across restarts)."""
+    if MULTI_PROCESS:
+        # Follows the shared generation, so every worker process's ETags agree
+        refresh_from_disk()
+    return changes_version()
+
+def changes_version():
+    """The version token of get_changes(), /events and the inline results of mutations."""
+    return f"{store_epoch}-{store_version}"
+
+@reads
+def get_changes(since):
+    """Describes what changed after the version token since (from an earlier call).
+
+    Returns {"version", "reset", "updated": {id: media}, "deleted": [ids],
+    "favorite_ids": list or None (unchanged)}. "reset" is True when the log
+    no longer reaches back to since, or since belongs to another run: the
+    caller must then reload everything and continue from "version".
+    """
+    version = changes_version()
+    epoch, _, number = (since or '').rpartition('-')
+    if epoch != store_epoch or not number.isdigit() or not change_log_start <= int(number) <= store_version:
+        return {"version": version, "reset": True, "updated": {}, "deleted": [], "favorite_ids": None}
+
+    since_version = int(number)
+    changed_ids = {}
+    favorites_changed = False
+    for change_version, kind, media_id in reversed(change_log):
+        if change_version <= since_version:
+            break
+        if kind == 'favorite':
+            favorites_changed = True
+        else:
+            changed_ids[media_id] = None
+
+    updated = {}
+    deleted = []
+    for media_id in changed_ids:
+        media = get_media_by_id(media_id)
+        if media is None:
+            deleted.append(media_id)
+        else:
+            updated[media_id] = media
+    return {
+        "version": version,
+        "reset": False,
+        "updated": updated,
+        "deleted": deleted,
+        "favorite_ids": get_favorites() if favorites_changed else None
+    }
 
 # --- Core CRUD Functions ---
+@writes
 def get_next_id():
     global next_id
     current_id = next_id
     next_id += 1
     return current_id
 
+@reads
 def get_all_media():
-    return db_store["media"]
+    """Returns {id: media}. The JSON engine returns a shallow copy so callers can iterate it while others write."""
+    if sql_store:
+        return sql_store.get_all_media()
+    return dict(db_store["media"])
 
+@reads
 def get_media_by_id(media_id):
+    if sql_store:
+        return sql_store.get_media_by_id(media_id)
     return db_store["media"].get(media_id)
 
+@reads
+def get_media_page(limit, after_id=None):
+    """Returns ({id: media} for up to limit items with id > after_id in id order, next after_id or None)."""
+    if sql_store:
+        return sql_store.get_media_page(limit, after_id)
+    start = bisect.bisect_right(sorted_ids, after_id) if after_id is not None else 0
+    page_ids = sorted_ids[start:start + limit]
+    media = db_store["media"]
+    next_after_id = page_ids[-1] if page_ids and start + limit < len(sorted_ids) else None
+    return {media_id: media[media_id] for media_id in page_ids}, next_after_id
+
+def iter_media(chunk_size=1000):
+    """Yields (id, media) in id order, fetching chunk_size items at a time.
+
+    Walks the catalog with keyset pagination, so it holds at most one chunk and
+    tolerates mutations made while it is being consumed.
+    """
+    after_id = None
+    while True:
+        page, after_id = get_media_page(chunk_size, after_id)
+        yield from page.items()
+        if after_id is None:
+            return
+
+@reads
+def get_media_by_category(category):
+    """Returns {id: media} for one category (case-insensitive) without scanning the catalog."""
+    if sql_store:
+        return sql_store.get_media_by_category(category)
+    media = db_store["media"]
+    return {media_id: media[media_id] for media_id in category_index.get(index_key(category), ())}
+
+@reads
+def find_media_by_name(name, limit=None):
+    """Returns {id: media} for every item whose name matches exactly (case-insensitive), up to limit."""
+    if sql_store:
+        return sql_store.find_media_by_name(name, limit)
+    media = db_store["media"]
+    ids = name_index.get(index_key(name), {})
+    if limit is not None:
+        ids = itertools.islice(ids, limit)
+    return {media_id: media[media_id] for media_id in ids}
+
+@reads
+def query_media(text, k=20):
+    """Ranked, typo-tolerant search over name and author. Returns up to k (id, media, score) tuples."""
+    results = []
+    for media_id, score in search_index.query(text, k):
+        media = get_media_by_id(media_id)
+        if media is not None:
+            results.append((media_id, media, score))
+    return results
+
+@writes
 def create_media(new_media):
+    if sql_store:
+        media_id = sql_store.create_media(new_media)
+        index_media(media_id, sql_store.get_media_by_id(media_id))
+        bump_version(media_id)
+        return media_id
     media_id = get_next_id()
+    try:
+        index_media(media_id, new_media)
+    except Exception:
+        rebuild_indexes()  # drop whatever part of the item was indexed
+        raise
     db_store["media"][media_id] = new_media
-    save_data(db_store)
+    bisect.insort(sorted_ids, media_id)
+    bump_version(media_id)
+    persist("put", media_id, new_media)
     return media_id
 
+@writes
 def update_media(media_id, updated_data):
+    if sql_store:
+        current_data = sql_store.get_media_by_id(media_id)
+        if current_data is None or not sql_store.update_media(media_id, updated_data):
+            return False
+        unindex_media(media_id, current_data)
+        index_media(media_id, sql_store.get_media_by_id(media_id))
+        bump_version(media_id)
+        return True
     if media_id in db_store["media"]:
         current_data = db_store["media"][media_id]
-        current_data.update(updated_data)
-        save_data(db_store)
+        unindex_media(media_id, current_data)
+        # Replace rather than mutate the record so readers never see it half-updated
+        new_data = dict(current_data, **updated_data)
+        db_store["media"][media_id] = new_data
+        try:
+            index_media(media_id, new_data)
+        except Exception:
+            db_store["media"][media_id] = current_data
+            rebuild_indexes()
+            raise
+        bump_version(media_id)
+        persist("put", media_id, new_data)
         return True
     return False
 
+@writes
 def delete_media(media_id):
+    if sql_store:
+        current_data = sql_store.get_media_by_id(media_id)
+        if current_data is None or not sql_store.delete_media(media_id):
+            return False
+        unindex_media(media_id, current_data)
+        bump_version(media_id)
+        return True
     if media_id in db_store["media"]:
-        del db_store["media"][media_id]
-        if media_id in db_store["favorites"]:
-            db_store["favorites"].remove(media_id)
-        save_data(db_store)
+        unindex_media(media_id, db_store["media"].pop(media_id))
+        del sorted_ids[bisect.bisect_left(sorted_ids, media_id)]
+        db_store["favorites"].pop(media_id, None)
+        bump_version(media_id)
+        persist("delete", media_id)
         return True
     return False
 
 # --- Favorites Functions ---
+@reads
 def get_favorites():
-    return db_store["favorites"]
+    """Returns the favorite ids as a list, in the order they were added."""
+    if sql_store:
+        return sql_store.get_favorites()
+    return list(db_store["favorites"])
+
+@reads
+def is_favorite(media_id):
+    if sql_store:
+        return sql_store.is_favorite(media_id)
+    return media_id in db_store["favorites"]
 
+@writes
 def add_favorite(media_id):
+    if sql_store:
+        if not sql_store.add_favorite(media_id):
+            return False
+        bump_version(media_id, 'favorite')
+        return True
     if media_id not in db_store["media"]:
         return False
     if media_id not in db_store["favorites"]:
-        db_store["favorites"].append(media_id)
-        save_data(db_store)
+        db_store["favorites"][media_id] = None
+        bump_version(media_id, 'favorite')
+        persist("fav_add", media_id)
         return True
     return False
 
+@writes
 def remove_favorite(media_id):
+    if sql_store:
+        if not sql_store.remove_favorite(media_id):
+            return False
+        bump_version(media_id, 'favorite')
+        return True
     if media_id in db_store["favorites"]:
-        db_store["favorites"].remove(media_id)
-        save_data(db_store)
+        del db_store["favorites"][media_id]
+        bump_version(media_id, 'favorite')
+        persist("fav_remove", media_id)
         return True
     return False
 
 # --- SCREENSHOT FUNCTIONS ---
+@writes
 def update_media_screenshot(media_id, screenshot_path):
     """Updates the screenshot path for a media item."""
+    if sql_store:
+        previous_path = sql_store.get_media_screenshot(media_id)
+        if not sql_store.update_media_screenshot(media_id, screenshot_path):
+            return False
+        count_screenshot(previous_path, -1)
+        count_screenshot(screenshot_path, 1)
+        indexed_fields[media_id] = (indexed_fields[media_id][0], screenshot_path)
+        bump_version(media_id)
+        return True
     if media_id in db_store["media"]:
-        db_store["media"][media_id]['screenshot'] = screenshot_path
-        save_data(db_store)
+        count_screenshot(db_store["media"][media_id].get('screenshot'), -1)
+        count_screenshot(screenshot_path, 1)
+        db_store["media"][media_id] = dict(db_store["media"][media_id], screenshot=screenshot_path)
+        bump_version(media_id)
+        persist("put", media_id, db_store["media"][media_id])
         return True
     return False
 
+@reads
 def get_media_screenshot(media_id):
     """Gets the screenshot path for a media item."""
+    if sql_store:
+        return sql_store.get_media_screenshot(media_id)
     if media_id in db_store["media"]:
         return db_store["media"][media_id].get('screenshot', None)
     return None
 
+@writes
 def remove_media_screenshot(media_id):
     """Removes the screenshot for a media item."""
+    if sql_store:
+        previous_path = sql_store.get_media_screenshot(media_id)
+        if not sql_store.remove_media_screenshot(media_id):
+            return False
+        count_screenshot(previous_path, -1)
+        indexed_fields[media_id] = (indexed_fields[media_id][0], None)
+        bump_version(media_id)
+        return True
     if media_id in db_store["media"]:
-        db_store["media"][media_id]['screenshot'] = None
-        save_data(db_store)
+        count_screenshot(db_store["media"][media_id].get('screenshot'), -1)
+        db_store["media"][media_id] = dict(db_store["media"][media_id], screenshot=None)
+        bump_version(media_id)
+        persist("put", media_id, db_store["media"][media_id])
         return True
     return False
 
+@reads
+def screenshot_refcount(screenshot_path):
+    """Number of media items whose screenshot is screenshot_path."""
+    return screenshot_refs.get(screenshot_path, 0)
+
+@writes
+def collect_screenshots(remove_file):
+    """Calls remove_file(path) for every screenshot no media item references any more.
+
+    Runs under the write lock, so an upload that re-references a path (and
+    holds the same lock) can't race with its removal.
+    """
+    orphans = [path for path in unreferenced_screenshots if path not in screenshot_refs]
+    unreferenced_screenshots.clear()
+    for path in orphans:
+        remove_file(path)
+    return orphans
+
 # --- NEW STATISTICS FUNCTION ---
-def get_media_statistics():
-    """Calculates and returns statistics about the media items."""
+@reads
+def get_media_statistics(check=None):
+    """Returns statistics about the media items from the maintained counters.
+
+    With check=True (or LIBRARY_CHECK_STATISTICS=1) the statistics are also
+    recomputed from scratch and a RuntimeError is raised if they differ.
+    """
+    stats = {
+        'total_items': sum(category_counts.values()),
+        'total_favorites': sql_store.count_favorites() if sql_store else len(db_store["favorites"]),
+        'categories': dict(category_counts)
+    }
+
+    if check is None:
+        check = CHECK_STATISTICS
+    if check:
+        expected = compute_media_statistics()
+        if stats != expected:
+            raise RuntimeError(f"Statistics counters out of sync: {stats} != {expected}")
+    return stats
+
+@reads
+def compute_media_statistics():
+    """Calculates statistics about the media items with a full pass over the store."""
+    if sql_store:
+        return sql_store.get_media_statistics()
     media = db_store["media"]
     stats = {
         'total_items': len(media),
@@ -187,7 +1233,144 @@ def get_media_statistics():
     
     # Calculate counts per category
     for item in media.values():
-        category = item.get('category', 'Unknown')
+        category = stats_category(item)
         stats['categories'][category] = stats['categories'].get(category, 0) + 1
         
-    return stats
\ No newline at end of file
+    return stats
+
+@reads
+def get_dashboard(limit):
+    """The first page of media, the favorite ids and statistics from one snapshot of the store.
+
+    Returns {"version", "media": {id: media}, "next_after_id", "favorite_ids", "stats"};
+    "version" is the token to ask get_changes() for anything newer.
+    """
+    page, next_after_id = get_media_page(limit)
+    return {
+        "version": changes_version(),
+        "media": page,
+        "next_after_id": next_after_id,
+        "favorite_ids": get_favorites(),
+        "stats": get_media_statistics()
+    }
+
+# --- BATCH FUNCTIONS ---
+def validate_operation(operation):
+    """Returns an error message if a batch operation is malformed, otherwise None."""
+    if not isinstance(operation, dict) or operation.get('op') not in BATCH_OPERATIONS:
+        return f'Each operation needs an "op" of: {", ".join(BATCH_OPERATIONS)}'
+    kind = operation['op']
+    media_id = operation.get('id')
+    # bool is a subclass of int, but "id": true is not an id
+    if kind != 'create' and (not isinstance(media_id, int) or isinstance(media_id, bool)):
+        return f'"{kind}" needs an integer "id"'
+    if kind in ('create', 'update'):
+        data = operation.get('data')
+        if not isinstance(data, dict) or not all(key in data for key in REQUIRED_FIELDS):
+            return f'Missing required fields in "data": {", ".join(REQUIRED_FIELDS)}'
+    return None
+
+def check_batch(operations):
+    """Dry-runs a batch against the current store and returns an error (or None) per operation."""
+    deleted = set()
+    favorites = {}  # favorite state changed earlier in the batch
+    errors = []
+    for operation in operations:
+        error = validate_operation(operation)
+        if error is None and operation['op'] != 'create':
+            kind, media_id = operation['op'], operation['id']
+            exists = media_id not in deleted and get_media_by_id(media_id) is not None
+            favorite = favorites.get(media_id, is_favorite(media_id))
+            if kind == 'unfavorite':
+                if favorite:
+                    favorites[media_id] = False
+                else:
+                    error = 'Media item was not in favorites'
+            elif not exists:
+                error = f'Media item with ID {media_id} not found'
+            elif kind == 'delete':
+                deleted.add(media_id)
+                favorites[media_id] = False
+            elif kind == 'favorite':
+                if favorite:
+                    error = 'Media item not found or already a favorite'
+                else:
+                    favorites[media_id] = True
+        errors.append(error)
+    return errors
+
+def apply_operation(operation):
+    """Applies one batch operation through the regular mutation functions."""
+    error = validate_operation(operation)
+    if error:
+        return {'op': operation.get('op') if isinstance(operation, dict) else None, 'ok': False, 'error': error}
+
+    kind, media_id = operation['op'], operation.get('id')
+    if kind == 'create':
+        media_id = create_media({key: operation['data'][key] for key in REQUIRED_FIELDS})
+        ok, error = True, None
+    elif kind == 'update':
+        ok = update_media(media_id, {key: operation['data'][key] for key in REQUIRED_FIELDS})
+        error = f'Media item with ID {media_id} not found'
+    elif kind == 'delete':
+        ok = delete_media(media_id)
+        error = f'Media item with ID {media_id} not found'
+    elif kind == 'favorite':
+        ok = add_favorite(media_id)
+        error = 'Media item not found or already a favorite'
+    else:
+        ok = remove_favorite(media_id)
+        error = 'Media item was not in favorites'
+
+    result = {'op': kind, 'id': media_id, 'ok': ok}
+    if not ok:
+        result['error'] = error
+    return result
+
+@contextlib.contextmanager
+def batch():
+    """Groups mutations so they are persisted once, when the outermost batch exits.
+
+    Takes the batch lock; the JSON engine collects journal records and writes
+    them in one go, SQLite runs everything in a single transaction.
+    """
+    global batch_entries
+    with exclusive():
+        if sql_store:
+            with sql_store.transaction():
+                yield
+            return
+        if batch_entries is not None:
+            # Nested batch: the outer one persists
+            yield
+            return
+
+        batch_entries = []
+        try:
+            yield
+        finally:
+            entries, batch_entries = batch_entries, None
+            if entries:
+                persist_entries(entries)
+
+@writes
+def apply_batch(operations, atomic=False):
+    """Applies a list of operations under the store write lock and persists the result once.
+
+    Each operation is {"op": "create"|"update"|"delete"|"favorite"|"unfavorite",
+    "id": ..., "data": {...}}. Returns (applied, results) with one result per
+    operation. With atomic=True nothing is applied unless every operation
+    would succeed.
+    """
+    if atomic:
+        errors = check_batch(operations)
+        if any(errors):
+            results = []
+            for operation, error in zip(operations, errors):
+                kind = operation.get('op') if isinstance(operation, dict) else None
+                results.append({'op': kind, 'ok': False, 'error': error or 'Not applied: another operation in the batch failed'})
+            return False, results
+
+    with batch():
+        results = [apply_operation(operation) for operation in operations]
+    return True, results
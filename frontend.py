@@ -5,10 +5,28 @@ import requests
 from datetime import datetime
 from PIL import Image, ImageTk
 import io
+from api_client import ApiClient
+from replica import MediaReplica
+from tree_rows import TreeRows
 
 # Base URL for the Flask backend (MUST match the running server address)
 BASE_URL = "http://127.0.0.1:5000"
 
+# The app keeps a local replica of the catalog, saved to REPLICA_FILE between
+# runs and kept current with /media/changes. Lists, filters and searches are
+# served from it; only a reset (first run, or a restarted server) downloads
+# the whole catalog, in pages of PAGE_SIZE items.
+REPLICA_FILE = "media_replica.json"
+PAGE_SIZE = 500
+MUTATION_INCLUDE = "include=media,stats" # mutations return the affected record and new statistics
+
+# Screenshot variant the viewer window displays (one of the backend's THUMBNAIL_SIZES)
+SCREENSHOT_VIEW_SIZE = 600
+# Screenshot URLs are content-addressed and served as immutable, so the bytes
+# of the last few viewed are kept and reused without asking the server again.
+SCREENSHOT_CACHE_SIZE = 50
+EVENT_RENDER_DELAY_MS = 100 # bursts of pushed changes are rendered once
+
 # --- Modern Color Palette ---
 COLOR_PRIMARY = "#4A90E2"  # Blue for accents
 COLOR_SECONDARY = "#50C479" # Green for success/create button
@@ -53,8 +71,18 @@ class LibraryDeskApp:
         self.current_media_list = []
         self.current_selected_item = None 
         self.current_selected_id = None 
-        self.favorites_list = []
+        self.favorites_list = set() # Favorite IDs, kept as a set for O(1) membership checks
         self.stats_labels = {} # Dictionary to hold statistic labels
+        self.api = ApiClient(master, BASE_URL) # Pooled session + worker threads; callbacks run on the Tk thread
+        self.category_trace_muted = False
+        self.replica = MediaReplica.load(REPLICA_FILE)
+        self.current_view = ('all', None) # What the treeview shows: ('all'|'category'|'favorites'|'search', argument)
+        self.rendered_view = None # current_view as of the last update_treeview
+        self.screenshot_cache = {} # screenshot URL -> image bytes, oldest first
+        self.event_render_pending = False
+        self.sync_running = False # a sync_replica() request is in flight
+        self.sync_pending = False # another sync was asked for meanwhile: run one more when it finishes
+        self.sync_callbacks = [] # on_synced callbacks waiting for the next sync to finish
 
         # --- HEADER ---
         header_frame = ttk.Frame(master, padding="15 10 15 10", style='Header.TLabel')
@@ -129,10 +157,12 @@ class LibraryDeskApp:
         
         self.media_tree.grid(row=0, column=0, sticky="nsew")
         self.media_tree.bind('<<TreeviewSelect>>', self.display_metadata_from_tree) 
+        self.tree_rows = TreeRows(self.media_tree) # Diffed, windowed rows (iid = media id)
         
-        scrollbar = ttk.Scrollbar(treeview_frame, orient=tk.VERTICAL, command=self.media_tree.yview)
+        # The scrollbar goes through tree_rows, so it spans the whole list and not just the rendered window
+        scrollbar = ttk.Scrollbar(treeview_frame, orient=tk.VERTICAL, command=self.tree_rows.yview)
         scrollbar.grid(row=0, column=1, sticky="ns")
-        self.media_tree.config(yscrollcommand=scrollbar.set)
+        self.media_tree.config(yscrollcommand=lambda first, last: self._on_tree_scroll(scrollbar, first, last))
         
         # --- RIGHT PANEL (Statistics and Details) ---
         right_panel = ttk.Frame(main_panedwindow, padding="15", style='TFrame')
@@ -191,77 +221,156 @@ class LibraryDeskApp:
         # (Screenshot buttons removed)
         
         # --- Initial Load ---
+        # Shows the replica saved by the last run at once, then syncs it
         self.update_favorites_list()
         self.load_all_media()
-        self.load_statistics() # Load stats initially
         self.clear_metadata_display()
+        # Live updates; every (re)connect first catches up on anything missed
+        self.api.listen("/events", self.on_server_event, on_connect=self.sync_replica)
 
     # --- Core Application Logic ---
 
     def refresh_data(self):
-        """Refreshes the favorites list, statistics, and reloads all media."""
+        """Syncs the replica with the backend (only what changed is transferred) and refreshes statistics."""
+        self.sync_replica(on_synced=lambda: messagebox.showinfo("Refresh", "Data reloaded and synchronized with backend."))
+
+    def sync_replica(self, on_synced=None):
+        """Applies the backend's changes since the replica's version and re-renders the current view.
+
+        The whole catalog is downloaded only without a replica or when the backend
+        asks for a reset: /dashboard brings the first page, the favorite ids and
+        the statistics in one request. Statistics are then kept from the replica.
+
+        Only one sync runs at a time. Calls made meanwhile (e.g. for pushed events
+        the replica couldn't apply yet) are folded into one more sync after it, so
+        a burst of events never restarts a download that is under way.
+        """
+        if on_synced:
+            self.sync_callbacks.append(on_synced)
+        if self.sync_running:
+            self.sync_pending = True
+            return
+        self.sync_running = True
+        callbacks, self.sync_callbacks = self.sync_callbacks, []
+        since = self.replica.version
+
+        def task():
+            if since:
+                changes = self.api.get_json("/media/changes", {'since': since}, cache=False)
+                if not changes.get('reset'):
+                    return changes
+            dashboard = self.api.get_json("/dashboard", {'limit': PAGE_SIZE}, cache=False)
+            items = dashboard['items']
+            catch_up = None
+            if dashboard['next_after_id'] is not None:
+                items += self._get_all_media_pages(dashboard['next_after_id'])
+                # Anything changed while the remaining pages were being fetched
+                catch_up = self.api.get_json("/media/changes", {'since': dashboard['version']}, cache=False)
+            return dict(dashboard, reset=True, items=items, catch_up=catch_up)
+
+        def on_synced_changes(result):
+            try:
+                if result['reset']:
+                    self.replica.reset(result['version'], result['items'], result['favorite_ids'])
+                    stats = result['stats']
+                    catch_up = result['catch_up']
+                    if catch_up is not None and catch_up['reset']:
+                        self.replica.version = None  # restarted mid-download: reload on the next sync
+                    elif catch_up is not None and self.replica.apply(catch_up):
+                        stats = self.replica.statistics()
+                    self.save_replica()
+                    changed = True
+                else:
+                    changed = self.replica.apply(result)
+                    stats = self.replica.statistics() if changed else None
+                if changed:
+                    self._show_statistics(stats)
+                    self.update_favorites_list()
+                    self.show_current_view()
+                for callback in callbacks:
+                    callback()
+            finally:
+                finish_sync()
+
+        def on_sync_error(error):
+            try:
+                self._show_request_error(error)
+            finally:
+                finish_sync()
+
+        def finish_sync():
+            self.sync_running = False
+            if self.sync_pending:
+                self.sync_pending = False
+                self.sync_replica()
+
+        self.api.submit(task, on_synced_changes, on_sync_error, channel='sync')
+
+    def on_server_event(self, name, event):
+        """Applies a change pushed over /events; falls back to a sync when events were missed."""
+        if name == 'hello':
+            return
+        if not self.replica.apply_event(event):
+            self.sync_replica()
+            return
+        if not self.event_render_pending:
+            self.event_render_pending = True
+            self.master.after(EVENT_RENDER_DELAY_MS, self._render_pushed_changes)
+
+    def _render_pushed_changes(self):
+        self.event_render_pending = False
         self.update_favorites_list()
-        self.load_statistics()
-        self.load_all_media()
-        messagebox.showinfo("Refresh", "Data reloaded and synchronized with backend.")
+        self.show_current_view()
+        self._show_statistics(self.replica.statistics())
 
-    def _get_media(self, url):
-        """Generic GET request to the backend with robust error handling."""
+    def save_replica(self):
         try:
-            response = requests.get(url)
-            response.raise_for_status() 
-            return response.json()
-        except requests.exceptions.ConnectionError:
+            self.replica.save(REPLICA_FILE)
+        except OSError as e:
+            print(f"Could not save the local replica: {e}")
+
+    def _show_request_error(self, error):
+        """Reports a failed backend request the same way for every view."""
+        if isinstance(error, requests.exceptions.ConnectionError):
             messagebox.showerror("Connection Error", 
                                  f"Failed to connect to backend at {BASE_URL}.\n"
                                  "Please ensure 'backend.py' is running in a separate terminal.")
-            return []
-        except requests.exceptions.HTTPError as e:
-            error_message = f"Server Error: {e.response.status_code} {e.response.reason}"
-            try:
-                error_data = e.response.json()
-                error_message = error_data.get('error', error_data.get('message', error_message))
-            except:
-                pass 
-            if e.response.status_code == 404:
-                return [] 
-            messagebox.showerror("HTTP Error", error_message)
-            return []
-        except Exception as e:
-            messagebox.showerror("Request Error", f"An unexpected error occurred during GET request: {e}")
-            return []
-            
-    def _post_put_delete_favorite(self, url, method='POST', json_data=None):
-        """Generic POST, PUT, DELETE request."""
+        elif isinstance(error, requests.exceptions.HTTPError):
+            default = f"Server Error: {error.response.status_code} {error.response.reason}"
+            messagebox.showerror("HTTP Error", self._error_message(error, default))
+        else:
+            messagebox.showerror("Request Error", f"An unexpected error occurred during GET request: {error}")
+
+    def _error_message(self, error, default):
+        """The backend's own 'error'/'message' text from a failed request, if it sent one."""
         try:
-            if method == 'POST':
-                response = requests.post(url, json=json_data)
-            elif method == 'PUT':
-                response = requests.put(url, json=json_data)
-            elif method == 'DELETE':
-                response = requests.delete(url)
-            elif method == 'GET': # Used for fetching single item details
-                 response = requests.get(url)
-            else:
-                raise ValueError("Invalid HTTP method specified.")
-                
-            response.raise_for_status()
-            return True, response.json()
-        except requests.exceptions.RequestException as e:
-            error_message = f"Failed to perform action: {e}"
-            try:
-                error_message = e.response.json().get('error', error_message)
-            except:
-                pass
+            error_data = error.response.json()
+            return error_data.get('error', error_data.get('message', default))
+        except Exception:
+            return default
+
+    def _post_put_delete_favorite(self, path, method='POST', json_data=None, on_done=None, channel=None):
+        """Generic POST, PUT, DELETE request; on_done(success, data) runs on the Tk thread."""
+        def on_success(data):
+            if on_done:
+                on_done(True, data)
+
+        def on_error(error):
             if method != 'GET':
-                 messagebox.showerror("Action Error", error_message)
-            return False, None
+                 messagebox.showerror("Action Error", self._error_message(error, f"Failed to perform action: {error}"))
+            if on_done:
+                on_done(False, None)
+
+        self.api.submit(lambda: self.api.send(method, path, json=json_data), on_success, on_error, channel=channel)
+
+    def _apply_mutation(self, media_id, result):
+        """Applies the record and statistics a mutation returned inline (MUTATION_INCLUDE), so nothing is refetched."""
+        self.replica.apply_record(result['version'], media_id, result['media'])
+        self._show_statistics(result['stats'])
+        self.update_favorites_list()
 
     # --- Statistics Logic ---
-    def load_statistics(self):
-        """Fetches and displays library statistics."""
-        stats = self._get_media(f"{BASE_URL}/stats")
-        
+    def _show_statistics(self, stats):
         if stats and isinstance(stats, dict):
             self.stats_labels['Total Items'].config(text=stats.get('total_items', 0))
             self.stats_labels['Total Favorites'].config(text=stats.get('total_favorites', 0))
@@ -275,25 +384,70 @@ class LibraryDeskApp:
                  label.config(text="N/A")
 
     # --- Data Loading and Filtering ---
-    def load_all_media(self):
-        self.category_var.set("All")
-        data = self._get_media(f"{BASE_URL}/media")
+    def _set_category_quietly(self, category):
+        """Moves the filter radio buttons without their trace reloading the list."""
+        self.category_trace_muted = True
+        try:
+            self.category_var.set(category)
+        finally:
+            self.category_trace_muted = False
+
+    def _get_all_media_pages(self, after_id=None):
+        """Fetches the catalog (after after_id) page by page using keyset pagination (runs on a worker thread)."""
+        media_list = []
+        params = {'limit': PAGE_SIZE}
+        if after_id is not None:
+            params['after_id'] = after_id
+        while True:
+            page = self.api.get_json("/media", params, cache=False)
+            if not isinstance(page, dict):
+                break
+            media_list.extend(page.get('items', []))
+            after_id = page.get('next_after_id')
+            if after_id is None:
+                break
+            params = dict(params, after_id=after_id)
+        return media_list
+
+    def show_current_view(self):
+        """Renders the current list from the replica and returns it."""
+        kind, argument = self.current_view
+        if kind == 'category':
+            data = self.replica.media_by_category(argument)
+        elif kind == 'favorites':
+            data = self.replica.favorites()
+        elif kind == 'search':
+            data = self.replica.media_by_name(argument)
+        else:
+            data = self.replica.all_media()
         self.update_treeview(data)
-        self.load_statistics()
+        return data
+
+    def load_all_media(self):
+        self.show_all_media()
+        self.sync_replica()
+
+    def show_all_media(self):
+        """Switches the list to every item, straight from the replica."""
+        self._set_category_quietly("All")
+        self.current_view = ('all', None)
+        self.show_current_view()
 
     def load_media_by_category(self):
+        if self.category_trace_muted:
+            return
         category = self.category_var.get()
         if category == "All":
             self.load_all_media()
             return
         
-        data = self._get_media(f"{BASE_URL}/media/category/{category}")
-        self.update_treeview(data)
+        self.current_view = ('category', category)
+        self.show_current_view()
 
     def load_favorites(self):
-        self.category_var.set("All")
-        data = self._get_media(f"{BASE_URL}/favorites")
-        self.update_treeview(data)
+        self._set_category_quietly("All")
+        self.current_view = ('favorites', None)
+        data = self.show_current_view()
         if data:
             messagebox.showinfo("Favorites", "Displaying your favorite items.")
         else:
@@ -305,70 +459,66 @@ class LibraryDeskApp:
             self.load_all_media()
             return
 
-        url = f"{BASE_URL}/media/search?name={search_name}"
-        data = self._get_media(url)
-        
-        self.update_treeview(data)
+        self.current_view = ('search', search_name)
+        data = self.show_current_view()
         if not data:
              messagebox.showinfo("Search Result", f"No media found with exact name: '{search_name}'.")
 
     # --- Favorites Logic ---
     def update_favorites_list(self):
-        try:
-            response = requests.get(f"{BASE_URL}/favorites/ids")
-            response.raise_for_status()
-            self.favorites_list = response.json().get('favorite_ids', [])
-        except requests.exceptions.RequestException:
-            self.favorites_list = []
+        self.favorites_list = set(self.replica.favorite_ids)
+        self._update_favorites_button_text()
 
     def toggle_favorite(self):
         media_id = self.current_selected_id
         if not media_id:
             return
 
-        if media_id in self.favorites_list:
-            success, _ = self._post_put_delete_favorite(f"{BASE_URL}/favorites/remove/{media_id}")
-            if success:
-                messagebox.showinfo("Favorites", f"Item (ID: {media_id}) removed from favorites.")
-        else:
-            success, _ = self._post_put_delete_favorite(f"{BASE_URL}/favorites/add/{media_id}")
-            if success:
-                messagebox.showinfo("Favorites", f"Item (ID: {media_id}) added to favorites.")
-        
-        if success:
+        adding = media_id not in self.favorites_list
+
+        def on_done(success, result):
+            if not success:
+                return
+            # Apply the change and the returned statistics locally instead of refetching
+            self.replica.apply_favorite(result['version'], media_id, adding)
             self.update_favorites_list()
-            self.load_statistics() # Update stats after favorite action
-            self._update_favorites_button_text()
+            self._show_statistics(result['stats'])
+            if self.current_view[0] == 'favorites':
+                self.show_current_view()
+            if adding:
+                messagebox.showinfo("Favorites", f"Item (ID: {media_id}) added to favorites.")
+            else:
+                messagebox.showinfo("Favorites", f"Item (ID: {media_id}) removed from favorites.")
 
+        action = 'add' if adding else 'remove'
+        self._post_put_delete_favorite(f"/favorites/{action}/{media_id}?include=stats", on_done=on_done)
 
     # --- GUI Update Methods ---
-    def _extract_year(self, date_str):
-        """Helper to extract year from YYYY-MM-DD date string."""
-        try:
-            return datetime.strptime(date_str, '%Y-%m-%d').year
-        except ValueError:
-            return 'N/A'
+    def _on_tree_scroll(self, scrollbar, first, last):
+        scrollbar.set(*self.tree_rows.on_scroll(first, last))
 
     def update_treeview(self, media_list):
-        for item in self.media_tree.get_children():
-            self.media_tree.delete(item)
-            
+        # Same view re-rendered (sync, pushed change): keep the scroll position
+        keep_window = self.rendered_view == self.current_view
+        self.rendered_view = self.current_view
         self.current_media_list = media_list
+        self.tree_rows.show(media_list, keep_window, visible_id=self.current_selected_id)
         
         if not media_list:
              self.clear_metadata_display()
              return
 
-        for media in media_list:
-            # We now pass (ID, Year, Category, Name) to the treeview
-            year = self._extract_year(media.get('publication_date', ''))
-            self.media_tree.insert('', tk.END, 
-                                   values=(media['id'], year, media['category'], media['name']))
-            
-        if media_list:
-            first_item = self.media_tree.get_children()[0]
-            self.media_tree.selection_set(first_item)
-            self.display_metadata_from_tree(None)
+        # Re-rendering after a sync keeps the selected item selected, even while
+        # it is scrolled out of the rendered window
+        selected_row = str(self.current_selected_id)
+        if self.media_tree.exists(selected_row) or self.tree_rows.selection() == selected_row:
+            first_item = selected_row
+        else:
+            first_item = self.tree_rows.order[0]
+        self.tree_rows.select(first_item)
+        if not keep_window and self.media_tree.exists(first_item):
+            self.media_tree.see(first_item)
+        self.display_metadata_from_tree(None)
 
     def clear_metadata_display(self):
         for label in self.detail_labels.values():
@@ -387,33 +537,39 @@ class LibraryDeskApp:
             self.favorites_button.config(text="⭐ Add to Favorites", style='Accent.TButton')
             
     def display_metadata_from_tree(self, event):
-        selected_items = self.media_tree.selection()
-        if not selected_items:
+        selected_row = self.tree_rows.selection()
+        if selected_row is None:
             self.clear_metadata_display()
             return 
 
-        self.current_selected_item = selected_items[0]
-        # Get all values, including the hidden ID (first element)
-        row_values = self.media_tree.item(self.current_selected_item, 'values') 
-        
-        if not row_values:
-            self.clear_metadata_display()
-            return
-
-        # ID is row_values[0]
-        media_id = int(row_values[0])
-        selected_media = next((media for media in self.current_media_list if media['id'] == media_id), None)
+        self.current_selected_item = selected_row
+        # Rows are inserted with iid = media id
+        media_id = int(self.current_selected_item)
+        selected_media = self.replica.items.get(media_id)
         
         if not selected_media:
             self.clear_metadata_display()
             return
 
         self.current_selected_id = media_id
-        
+        self._show_media_details(selected_media)
+
+        if 'author' not in selected_media:
+            # Rows from the paginated listing only carry the treeview columns
+            def on_done(success, full_media):
+                if success and isinstance(full_media, dict):
+                    selected_media.update(full_media)
+                    if self.current_selected_id == media_id:
+                        self._show_media_details(selected_media)
+
+            self._post_put_delete_favorite(f"/media/{media_id}", method='GET', on_done=on_done, channel='details')
+
+    def _show_media_details(self, selected_media):
         # Update details panel
         self.detail_labels['ID'].config(text=str(selected_media.get('id', 'N/A')), foreground=COLOR_TEXT_DARK)
         self.detail_labels['Name'].config(text=selected_media.get('name', 'N/A'), foreground=COLOR_TEXT_DARK)
-        self.detail_labels['Author'].config(text=selected_media.get('author', 'N/A'), foreground=COLOR_TEXT_DARK)
+        # '---' until the full record arrives for rows from the paginated listing
+        self.detail_labels['Author'].config(text=selected_media.get('author', '---'), foreground=COLOR_TEXT_DARK)
         self.detail_labels['Category'].config(text=selected_media.get('category', 'N/A'), foreground=COLOR_TEXT_DARK)
         self.detail_labels['Publication Date'].config(text=selected_media.get('publication_date', 'N/A'), foreground=COLOR_TEXT_DARK)
         
@@ -435,15 +591,15 @@ class LibraryDeskApp:
             return
 
         media_id = self.current_selected_id
-        url = f"{BASE_URL}/media/{media_id}"
-        
+
         # Fetch current data to pre-fill
-        success, response_data = self._post_put_delete_favorite(url, method='GET')
-        
-        if success and response_data and isinstance(response_data, dict):
-            self._open_crud_dialog(is_create=False, media_data=response_data)
-        else:
-             messagebox.showerror("Error", f"Could not fetch data for editing Media ID: {media_id}")
+        def on_done(success, response_data):
+            if success and response_data and isinstance(response_data, dict):
+                self._open_crud_dialog(is_create=False, media_data=response_data)
+            else:
+                 messagebox.showerror("Error", f"Could not fetch data for editing Media ID: {media_id}")
+
+        self._post_put_delete_favorite(f"/media/{media_id}", method='GET', on_done=on_done)
 
     def _open_crud_dialog(self, is_create=True, media_data=None):
         """Generalized dialog for both Create and Edit."""
@@ -514,18 +670,20 @@ class LibraryDeskApp:
                 messagebox.showerror("Validation Error", "Publication Date must be in YYYY-MM-DD format (e.g., 2024-01-15).")
                 return
 
+            def on_done(success, result):
+                if success:
+                    self._apply_mutation(result['id'] if is_create else media_data['id'], result)
+                    messagebox.showinfo("Success", message)
+                    dialog.destroy()
+                    self.show_all_media()
+                # Error message handled in _post_put_delete_favorite
+
             if is_create:
-                success, _ = self._post_put_delete_favorite(f"{BASE_URL}/media", method='POST', json_data=payload)
                 message = "New media item created successfully!"
+                self._post_put_delete_favorite(f"/media?{MUTATION_INCLUDE}", method='POST', json_data=payload, on_done=on_done)
             else:
-                success, _ = self._post_put_delete_favorite(f"{BASE_URL}/media/{media_data['id']}", method='PUT', json_data=payload)
                 message = f"Media ID {media_data['id']} updated successfully!"
-                
-            if success:
-                messagebox.showinfo("Success", message)
-                dialog.destroy()
-                self.load_all_media() 
-            # Error message handled in _post_put_delete_favorite
+                self._post_put_delete_favorite(f"/media/{media_data['id']}?{MUTATION_INCLUDE}", method='PUT', json_data=payload, on_done=on_done)
 
         button_frame = ttk.Frame(dialog_frame)
         button_frame.grid(row=len(fields)+1, column=0, columnspan=2, pady=10, sticky='e')
@@ -541,12 +699,14 @@ class LibraryDeskApp:
         if not media_id or not messagebox.askyesno("Confirm Deletion", f"Are you sure you want to delete '{media_name}' (ID: {media_id})?"):
             return
 
-        success, _ = self._post_put_delete_favorite(f"{BASE_URL}/media/{media_id}", method='DELETE')
-            
-        if success:
-            messagebox.showinfo("Success", f"Media item '{media_name}' deleted.")
-            self.load_all_media() 
-            self.clear_metadata_display()
+        def on_done(success, result):
+            if success:
+                self._apply_mutation(media_id, result)
+                messagebox.showinfo("Success", f"Media item '{media_name}' deleted.")
+                self.show_all_media()
+                self.clear_metadata_display()
+
+        self._post_put_delete_favorite(f"/media/{media_id}?{MUTATION_INCLUDE}", method='DELETE', on_done=on_done)
 
     # --- Screenshot Management Methods ---
     def upload_screenshot(self):
@@ -570,18 +730,21 @@ class LibraryDeskApp:
         if not file_path:
             return
         
-        try:
+        def upload():
             with open(file_path, 'rb') as f:
-                files = {'file': f}
-                response = requests.post(f"{BASE_URL}/media/{media_id}/screenshot", files=files)
-                
-            response.raise_for_status()
+                return self.api.send('POST', f"/media/{media_id}/screenshot?{MUTATION_INCLUDE}", files={'file': f})
+
+        def on_success(result):
+            self._apply_mutation(media_id, result)
             messagebox.showinfo("Success", "Screenshot uploaded successfully!")
             # Refresh the display
             self.display_metadata_from_tree(None)
-        except requests.exceptions.RequestException as e:
+
+        def on_error(e):
             messagebox.showerror("Error", f"Failed to upload screenshot: {str(e)}")
 
+        self.api.submit(upload, on_success, on_error)
+
     def delete_screenshot(self):
         """Delete the screenshot for the selected media item."""
         media_id = self.current_selected_id
@@ -592,15 +755,17 @@ class LibraryDeskApp:
         if not messagebox.askyesno("Confirm", "Delete the screenshot for this media item?"):
             return
         
-        try:
-            response = requests.delete(f"{BASE_URL}/media/{media_id}/screenshot")
-            response.raise_for_status()
+        def on_success(result):
+            self._apply_mutation(media_id, result)
             messagebox.showinfo("Success", "Screenshot deleted successfully!")
             # Refresh the display
             self.display_metadata_from_tree(None)
-        except requests.exceptions.RequestException as e:
+
+        def on_error(e):
             messagebox.showerror("Error", f"Failed to delete screenshot: {str(e)}")
 
+        self.api.submit(lambda: self.api.send('DELETE', f"/media/{media_id}/screenshot?{MUTATION_INCLUDE}"), on_success, on_error)
+
     def view_screenshot(self):
         """View the screenshot for the selected media item in a new window."""
         media_id = self.current_selected_id
@@ -608,55 +773,73 @@ class LibraryDeskApp:
             messagebox.showwarning("No Selection", "Please select a media item first.")
             return
         
-        try:
+        def fetch():
             # Get screenshot info
-            response = requests.get(f"{BASE_URL}/media/{media_id}/screenshot")
-            response.raise_for_status()
-            data = response.json()
-            
-            if not data.get('has_screenshot'):
-                messagebox.showinfo("No Screenshot", "This media item has no screenshot yet.")
-                return
-            
+            data = self.api.get_json(f"/media/{media_id}/screenshot")
             screenshot_path = data.get('screenshot_path')
-            if not screenshot_path:
-                return
-            
-            # Download and display the image
-            img_response = requests.get(f"{BASE_URL}/{screenshot_path}")
-            img_response.raise_for_status()
-            
-            # Create image from bytes
-            img = Image.open(io.BytesIO(img_response.content))
-            
-            # Create new window to display image
-            img_window = tk.Toplevel(self.master)
-            img_window.title(f"Screenshot - {self.detail_labels['Name'].cget('text')}")
+            if not data.get('has_screenshot') or not screenshot_path:
+                return None
             
-            # Resize image to fit window (max 600x600)
-            img.thumbnail((600, 600), Image.Resampling.LANCZOS)
-            photo = ImageTk.PhotoImage(img)
-            
-            label = ttk.Label(img_window, image=photo)
-            label.image = photo
-            label.pack(padx=10, pady=10)
-            
-            # Save button
-            def save_image():
-                save_path = filedialog.asksaveasfilename(
-                    defaultextension=".png",
-                    filetypes=[("PNG", "*.png"), ("JPEG", "*.jpg"), ("All Files", "*.*")]
-                )
-                if save_path:
-                    img.save(save_path)
-                    messagebox.showinfo("Success", f"Image saved to {save_path}")
-            
-            ttk.Button(img_window, text="💾 Save Image", command=save_image).pack(pady=10)
-            
-        except requests.exceptions.RequestException as e:
+            # Download the display-sized variant; the original is only fetched when saving
+            screenshot_url = f"/screenshot/{screenshot_path.rsplit('/', 1)[-1]}"
+            image_bytes = self.screenshot_cache.get(screenshot_url)
+            if image_bytes is None:
+                image_bytes = self.api.get_bytes(screenshot_url, {'size': SCREENSHOT_VIEW_SIZE})
+            return screenshot_url, image_bytes
+
+        def on_error(e):
             messagebox.showerror("Error", f"Failed to view screenshot: {str(e)}")
 
+        self.api.submit(fetch, self._show_screenshot, on_error, channel='screenshot')
+
+    def _show_screenshot(self, result):
+        if result is None:
+            messagebox.showinfo("No Screenshot", "This media item has no screenshot yet.")
+            return
+        screenshot_url, image_bytes = result
+        if screenshot_url not in self.screenshot_cache:
+            if len(self.screenshot_cache) >= SCREENSHOT_CACHE_SIZE:
+                del self.screenshot_cache[next(iter(self.screenshot_cache))]
+            self.screenshot_cache[screenshot_url] = image_bytes
+        
+        # Create image from bytes
+        img = Image.open(io.BytesIO(image_bytes))
+        
+        # Create new window to display image
+        img_window = tk.Toplevel(self.master)
+        img_window.title(f"Screenshot - {self.detail_labels['Name'].cget('text')}")
+        
+        # No-op unless the server sent the original (e.g. it has no Pillow)
+        img.thumbnail((SCREENSHOT_VIEW_SIZE, SCREENSHOT_VIEW_SIZE), Image.Resampling.LANCZOS)
+        photo = ImageTk.PhotoImage(img)
+        
+        label = ttk.Label(img_window, image=photo)
+        label.image = photo
+        label.pack(padx=10, pady=10)
+        
+        # Save button
+        def save_image():
+            save_path = filedialog.asksaveasfilename(
+                defaultextension=".png",
+                filetypes=[("PNG", "*.png"), ("JPEG", "*.jpg"), ("All Files", "*.*")]
+            )
+            if not save_path:
+                return
+
+            def on_downloaded(original_bytes):
+                Image.open(io.BytesIO(original_bytes)).save(save_path)
+                messagebox.showinfo("Success", f"Image saved to {save_path}")
+
+            def on_error(e):
+                messagebox.showerror("Error", f"Failed to download screenshot: {str(e)}")
+
+            self.api.submit(lambda: self.api.get_bytes(screenshot_url), on_downloaded, on_error)
+        
+        ttk.Button(img_window, text="💾 Save Image", command=save_image).pack(pady=10)
+
 if __name__ == '__main__':
     root = tk.Tk()
     app = LibraryDeskApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    app.api.close()
+    app.save_replica()
\ No newline at end of file
@@ -0,0 +1,159 @@
+# replica.py - Local copy of the media catalog for the desk app, kept current via /media/changes
+import json
+import os
+
+
+def split_version(version):
+    """'<epoch>-<n>' -> (epoch, n)"""
+    epoch, _, number = version.rpartition('-')
+    return epoch, int(number) if number.isdigit() else -1
+
+def match_key(value):
+    # Older clients could store numbers as names or categories, like database.index_key
+    return str(value).casefold() if value is not None else ''
+
+
+class MediaReplica:
+    """Every media record and the favorite ids, plus the server version they reflect.
+
+    Filters and searches run against this copy; the app only asks the server
+    for what changed since `version`. Saved to disk between runs.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.items = {}            # media_id -> record (including 'id')
+        self.favorite_ids = {}     # insertion-ordered set: media_id -> None
+
+    @classmethod
+    def load(cls, path):
+        """Reads a replica saved by save(); an empty one if the file is missing or unreadable."""
+        replica = cls()
+        if not os.path.exists(path):
+            return replica
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            replica.version = data['version']
+            replica.items = {item['id']: item for item in data['items']}
+            replica.favorite_ids = dict.fromkeys(data['favorite_ids'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return cls()
+        return replica
+
+    def save(self, path):
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({
+                'version': self.version,
+                'items': list(self.items.values()),
+                'favorite_ids': list(self.favorite_ids)
+            }, f)
+        os.replace(temp_path, path)
+
+    def reset(self, version, items, favorite_ids):
+        """Replaces the whole replica with a full download."""
+        self.version = version
+        self.items = {item['id']: item for item in items}
+        self.favorite_ids = dict.fromkeys(favorite_ids)
+
+    def apply(self, changes):
+        """Applies a non-reset /media/changes response. Returns True if anything changed."""
+        if self.version is not None:
+            epoch, number = split_version(changes['version'])
+            current_epoch, current_number = split_version(self.version)
+            if epoch == current_epoch and number < current_number:
+                return False  # events have already taken the replica further
+        for item in changes['updated']:
+            self.items[item['id']] = item
+        for media_id in changes['deleted']:
+            self.items.pop(media_id, None)
+            self.favorite_ids.pop(media_id, None)
+        if 'favorite_ids' in changes:
+            self.favorite_ids = dict.fromkeys(changes['favorite_ids'])
+        self.version = changes['version']
+        return bool(changes['updated'] or changes['deleted'] or 'favorite_ids' in changes)
+
+    def apply_event(self, event):
+        """Applies one /events change. Returns False if the replica can't follow it
+        (a reset, or events were missed) and needs a sync via /media/changes."""
+        if event.get('type') not in ('media', 'favorite') or self.version is None:
+            return False
+        epoch, number = split_version(event['version'])
+        current_epoch, current_number = split_version(self.version)
+        if epoch != current_epoch or number > current_number + 1:
+            return False
+        if number <= current_number:
+            return True  # already included by a sync
+        media_id = event['id']
+        if event['type'] == 'favorite':
+            if event['favorite']:
+                self.favorite_ids[media_id] = None
+            else:
+                self.favorite_ids.pop(media_id, None)
+        elif event['media'] is None:
+            self.items.pop(media_id, None)
+            self.favorite_ids.pop(media_id, None)
+        else:
+            self.items[media_id] = dict(event['media'], id=media_id)
+        self.version = event['version']
+        return True
+
+    def includes(self, version):
+        """True if the replica already reflects version (or something newer from the same run)."""
+        if self.version is None:
+            return False
+        epoch, number = split_version(version)
+        current_epoch, current_number = split_version(self.version)
+        return epoch == current_epoch and number <= current_number
+
+    def apply_record(self, version, media_id, media):
+        """Applies a record a mutation returned inline (?include=media); None means deleted.
+
+        The replica's version is left alone, since changes before this one may still
+        be on their way; a later sync or event delivers the same state again.
+        """
+        if self.includes(version):
+            return
+        if media is None:
+            self.items.pop(media_id, None)
+            self.favorite_ids.pop(media_id, None)
+        else:
+            self.items[media_id] = media
+
+    def apply_favorite(self, version, media_id, favorite):
+        """Applies a favorite change the app made itself, like apply_record()."""
+        if self.includes(version):
+            return
+        if favorite:
+            self.favorite_ids[media_id] = None
+        else:
+            self.favorite_ids.pop(media_id, None)
+
+    def statistics(self):
+        """The same figures as /stats, computed from the replica."""
+        categories = {}
+        for item in self.items.values():
+            category = item.get('category') or 'Unknown'
+            categories[category] = categories.get(category, 0) + 1
+        return {
+            'total_items': len(self.items),
+            'total_favorites': sum(1 for media_id in self.favorite_ids if media_id in self.items),
+            'categories': categories
+        }
+
+    # --- Local queries (same semantics as the matching backend routes) ---
+    def all_media(self):
+        return sorted(self.items.values(), key=lambda item: item['id'])
+
+    def media_by_category(self, category):
+        key = match_key(category)
+        return [item for item in self.all_media() if match_key(item.get('category')) == key]
+
+    def media_by_name(self, name):
+        """Exact, case-insensitive name match, like /media/search."""
+        key = match_key(name)
+        return [item for item in self.all_media() if match_key(item.get('name')) == key]
+
+    def favorites(self):
+        return [self.items[media_id] for media_id in self.favorite_ids if media_id in self.items]
@@ -0,0 +1,138 @@
+# search_index.py - Ranked full-text and fuzzy search over media names and authors
+import heapq
+import math
+import re
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# Name matches count for more than author matches
+FIELD_WEIGHTS = {'name': 2.0, 'author': 1.0}
+
+# Fuzzy matching: vocabulary terms sharing trigrams with a query term are
+# candidates; those within an edit distance of one typo (two for terms of
+# FUZZY_LONG_TERM letters or more) also match, weighted by how close they are.
+# Terms shorter than FUZZY_MIN_TERM only match exactly.
+FUZZY_MIN_TERM = 3
+FUZZY_LONG_TERM = 6
+FUZZY_MAX_EXPANSIONS = 5
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text).casefold() if text is not None else '')
+
+def trigrams(token):
+    padded = f'${token}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def max_typos(term):
+    if len(term) < FUZZY_MIN_TERM:
+        return 0
+    return 1 if len(term) < FUZZY_LONG_TERM else 2
+
+def edit_distance(a, b, limit):
+    """Edits (insertions, deletions, substitutions, adjacent swaps) turning a into b, or limit + 1 if more."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+class SearchIndex:
+    """Inverted index of name/author tokens plus a trigram index over the vocabulary for typo tolerance."""
+
+    def __init__(self):
+        self.postings = {}        # token -> {media_id: field weight}
+        self.trigram_index = {}   # trigram -> set of tokens containing it
+        self.doc_tokens = {}      # media_id -> tokens indexed for it, so removal needs no old record
+
+    def __len__(self):
+        return len(self.doc_tokens)
+
+    def clear(self):
+        self.postings.clear()
+        self.trigram_index.clear()
+        self.doc_tokens.clear()
+
+    def add(self, media_id, media):
+        """Indexes a media item, replacing any previous entry for the same id."""
+        if media_id in self.doc_tokens:
+            self.remove(media_id)
+
+        weights = {}
+        for field, field_weight in FIELD_WEIGHTS.items():
+            for token in tokenize(media.get(field)):
+                weights[token] = max(weights.get(token, 0.0), field_weight)
+
+        for token, weight in weights.items():
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = {}
+                if not token.isdigit():
+                    for trigram in trigrams(token):
+                        self.trigram_index.setdefault(trigram, set()).add(token)
+            posting[media_id] = weight
+        self.doc_tokens[media_id] = tuple(weights)
+
+    def remove(self, media_id):
+        for token in self.doc_tokens.pop(media_id, ()):
+            posting = self.postings[token]
+            del posting[media_id]
+            if not posting:
+                del self.postings[token]
+                if not token.isdigit():
+                    for trigram in trigrams(token):
+                        tokens = self.trigram_index[trigram]
+                        tokens.discard(token)
+                        if not tokens:
+                            del self.trigram_index[trigram]
+
+    def expand(self, term):
+        """Returns [(vocabulary token, similarity)] for a query term: the exact token and/or its closest fuzzy matches."""
+        if term in self.postings:
+            return [(term, 1.0)]
+        if term.isdigit():
+            return []
+
+        limit = max_typos(term)
+        if not limit:
+            return []
+        term_trigrams = trigrams(term)
+        shared = {}
+        for trigram in term_trigrams:
+            for token in self.trigram_index.get(trigram, ()):
+                shared[token] = shared.get(token, 0) + 1
+
+        # Each typo touches at most four padded trigrams, so closer tokens share at least this many
+        min_shared = max(1, len(term_trigrams) - 4 * limit)
+        candidates = []
+        for token, count in shared.items():
+            if count < min_shared:
+                continue
+            distance = edit_distance(term, token, limit)
+            if distance <= limit:
+                candidates.append((token, 1.0 - distance / max(len(term), len(token)), count))
+        best = heapq.nlargest(FUZZY_MAX_EXPANSIONS, candidates, key=lambda candidate: candidate[1:])
+        return [(token, similarity) for token, similarity, _ in best]
+
+    def query(self, text, k=20):
+        """Returns up to k (media_id, score) pairs, best first."""
+        total = len(self.doc_tokens)
+        scores = {}
+        for term in set(tokenize(text)):
+            for token, similarity in self.expand(term):
+                posting = self.postings[token]
+                idf = math.log(1.0 + total / len(posting))
+                for media_id, weight in posting.items():
+                    scores[media_id] = scores.get(media_id, 0.0) + similarity * idf * weight
+        # Ties go to the lower (older) id
+        return heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
@@ -0,0 +1,254 @@
+# sqlite_store.py - SQLite storage engine for database.py
+import contextlib
+import sqlite3
+import threading
+
+# Columns stored for every media item, in the order used by SELECT statements
+MEDIA_COLUMNS = ('name', 'publication_date', 'author', 'category', 'screenshot')
+
+SCHEMA = """
+-- AUTOINCREMENT: like the JSON store, never hand out the id of a deleted item again
+CREATE TABLE IF NOT EXISTS media (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    publication_date TEXT,
+    author TEXT,
+    category TEXT,
+    screenshot TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_media_category ON media (category COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_media_name ON media (name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_media_publication_date ON media (publication_date);
+CREATE TABLE IF NOT EXISTS favorites (
+    position INTEGER PRIMARY KEY,
+    media_id INTEGER NOT NULL UNIQUE REFERENCES media (id) ON DELETE CASCADE
+);
+-- Recent mutations by generation number, so other processes can re-index just what changed
+CREATE TABLE IF NOT EXISTS changes (
+    generation INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    media_id INTEGER NOT NULL
+);
+"""
+
+SELECT_MEDIA = f"SELECT id, {', '.join(MEDIA_COLUMNS)} FROM media"
+
+
+def row_to_media(row):
+    """Converts a media row into (id, media dict) in the same shape the JSON store uses."""
+    return row[0], dict(zip(MEDIA_COLUMNS, row[1:]))
+
+
+class ThreadConnection:
+    """One thread's connection, kept in that thread's local storage.
+
+    Python releases a thread's local storage when the thread ends, which closes
+    the connection: servers that start a thread per request don't pile up
+    connections and file descriptors.
+    """
+
+    def __init__(self, store, conn):
+        self.store = store
+        self.conn = conn
+
+    def __del__(self):
+        self.store.release(self.conn)
+
+
+class SQLiteStore:
+    """Media catalog kept in an SQLite database in WAL mode, with one connection per live thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.connections = set()
+        self.connections_lock = threading.Lock()
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        """Returns this thread's connection, opening it on first use."""
+        holder = getattr(self.local, 'holder', None)
+        if holder is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            holder = self.local.holder = ThreadConnection(self, conn)
+            with self.connections_lock:
+                self.connections.add(conn)
+        return holder.conn
+
+    def release(self, conn):
+        """Closes a connection whose thread has ended (unless close() already did)."""
+        with self.connections_lock:
+            if conn not in self.connections:
+                return
+            self.connections.discard(conn)
+        conn.close()
+
+    def close(self):
+        """Closes every open connection."""
+        with self.connections_lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = set()
+        self.local = threading.local()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Runs the enclosed statements in one transaction on this thread's connection.
+
+        Nested calls join the outermost transaction, so a batch of operations
+        commits (and syncs) once.
+        """
+        conn = self.connection()
+        depth = getattr(self.local, 'depth', 0)
+        self.local.depth = depth + 1
+        try:
+            if depth:
+                yield conn
+            else:
+                with conn:
+                    yield conn
+        finally:
+            self.local.depth = depth
+
+    def is_empty(self):
+        return self.connection().execute("SELECT 1 FROM media LIMIT 1").fetchone() is None
+
+    def import_data(self, data):
+        """Bulk-loads a {"media": {...}, "favorites": [...]} store, e.g. the JSON snapshot."""
+        with self.transaction() as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO media (id, {', '.join(MEDIA_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                ((media_id, *(media.get(column) for column in MEDIA_COLUMNS)) for media_id, media in data["media"].items())
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO favorites (media_id) SELECT id FROM media WHERE id = ?",
+                ((media_id,) for media_id in data.get("favorites", []))
+            )
+
+    # --- Media ---
+    def get_all_media(self):
+        rows = self.connection().execute(f"{SELECT_MEDIA} ORDER BY id")
+        return dict(row_to_media(row) for row in rows)
+
+    def iter_media(self):
+        """Yields (id, media) for every row without materialising the whole table."""
+        for row in self.connection().execute(f"{SELECT_MEDIA} ORDER BY id"):
+            yield row_to_media(row)
+
+    def get_media_by_id(self, media_id):
+        row = self.connection().execute(f"{SELECT_MEDIA} WHERE id = ?", (media_id,)).fetchone()
+        return row_to_media(row)[1] if row else None
+
+    def get_media_page(self, limit, after_id=None):
+        rows = self.connection().execute(
+            f"{SELECT_MEDIA} WHERE id > ? ORDER BY id LIMIT ?",
+            (after_id if after_id is not None else -1, limit + 1)
+        ).fetchall()
+        next_after_id = rows[limit - 1][0] if len(rows) > limit else None
+        return dict(row_to_media(row) for row in rows[:limit]), next_after_id
+
+    def get_media_by_category(self, category):
+        rows = self.connection().execute(f"{SELECT_MEDIA} WHERE category = ? COLLATE NOCASE ORDER BY id", (category,))
+        return dict(row_to_media(row) for row in rows)
+
+    def find_media_by_name(self, name, limit=None):
+        rows = self.connection().execute(
+            f"{SELECT_MEDIA} WHERE name = ? COLLATE NOCASE ORDER BY id LIMIT ?",
+            (name, limit if limit is not None else -1)
+        )
+        return dict(row_to_media(row) for row in rows)
+
+    def create_media(self, new_media):
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                f"INSERT INTO media ({', '.join(MEDIA_COLUMNS)}) VALUES (?, ?, ?, ?, ?)",
+                tuple(new_media.get(column) for column in MEDIA_COLUMNS)
+            )
+        return cursor.lastrowid
+
+    def update_media(self, media_id, updated_data):
+        """Updates the known columns present in updated_data; other keys are ignored."""
+        columns = [column for column in MEDIA_COLUMNS if column in updated_data]
+        with self.transaction() as conn:
+            if not columns:
+                return conn.execute("SELECT 1 FROM media WHERE id = ?", (media_id,)).fetchone() is not None
+            cursor = conn.execute(
+                f"UPDATE media SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?",
+                (*(updated_data[column] for column in columns), media_id)
+            )
+        return cursor.rowcount > 0
+
+    def delete_media(self, media_id):
+        with self.transaction() as conn:
+            cursor = conn.execute("DELETE FROM media WHERE id = ?", (media_id,))
+        return cursor.rowcount > 0
+
+    # --- Favorites ---
+    def get_favorites(self):
+        rows = self.connection().execute("SELECT media_id FROM favorites ORDER BY position")
+        return [row[0] for row in rows]
+
+    def is_favorite(self, media_id):
+        return self.connection().execute("SELECT 1 FROM favorites WHERE media_id = ?", (media_id,)).fetchone() is not None
+
+    def count_favorites(self):
+        return self.connection().execute("SELECT COUNT(*) FROM favorites").fetchone()[0]
+
+    def add_favorite(self, media_id):
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO favorites (media_id) SELECT id FROM media WHERE id = ?", (media_id,)
+            )
+        return cursor.rowcount > 0
+
+    def remove_favorite(self, media_id):
+        with self.transaction() as conn:
+            cursor = conn.execute("DELETE FROM favorites WHERE media_id = ?", (media_id,))
+        return cursor.rowcount > 0
+
+    # --- Screenshots ---
+    def update_media_screenshot(self, media_id, screenshot_path):
+        return self.update_media(media_id, {'screenshot': screenshot_path})
+
+    def get_media_screenshot(self, media_id):
+        row = self.connection().execute("SELECT screenshot FROM media WHERE id = ?", (media_id,)).fetchone()
+        return row[0] if row else None
+
+    def remove_media_screenshot(self, media_id):
+        return self.update_media(media_id, {'screenshot': None})
+
+    # --- Change Log (multi-process mode) ---
+    def record_changes(self, after_generation, changes, keep):
+        """Stores (generation, kind, media_id) rows for the mutations after after_generation.
+
+        Rows left past after_generation (e.g. by a run with an older generation
+        file) are replaced, and only the newest `keep` rows are kept.
+        """
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM changes WHERE generation > ?", (after_generation,))
+            conn.executemany("INSERT INTO changes (generation, kind, media_id) VALUES (?, ?, ?)", changes)
+            if changes:
+                conn.execute("DELETE FROM changes WHERE generation <= ?", (changes[-1][0] - keep,))
+
+    def get_changes(self, after_generation):
+        """Returns the (generation, kind, media_id) rows after after_generation, oldest first."""
+        return self.connection().execute(
+            "SELECT generation, kind, media_id FROM changes WHERE generation > ? ORDER BY generation",
+            (after_generation,)
+        ).fetchall()
+
+    # --- Statistics ---
+    def get_media_statistics(self):
+        conn = self.connection()
+        categories = {
+            (category if category is not None else 'Unknown'): count
+            for category, count in conn.execute("SELECT category, COUNT(*) FROM media GROUP BY category")
+        }
+        return {
+            'total_items': sum(categories.values()),
+            'total_favorites': self.count_favorites(),
+            'categories': categories
+        }
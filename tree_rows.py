@@ -0,0 +1,150 @@
+# tree_rows.py - Keeps the media Treeview in step with a list, touching only rows that changed
+RENDER_WINDOW = 200  # rows materialized around the visible ones (a screen is ~25 rows)
+SHIFT_MARGIN = 0.1   # view within this fraction of either end of the window -> move the window
+
+
+def media_year(date_str):
+    """Year of a 'YYYY-MM-DD' date by slicing, without a strptime per row; 'N/A' if malformed."""
+    if len(date_str) == 10 and date_str[4] == '-' and date_str[7] == '-' and date_str[:4].isdigit():
+        return date_str[:4]
+    return 'N/A'
+
+def row_values(media):
+    """Treeview columns (HiddenID, Year, Category, Name) for one record."""
+    return (media['id'], media_year(media.get('publication_date') or ''),
+            media.get('category', ''), media.get('name', ''))
+
+
+class TreeRows:
+    """Shows a media list in a ttk.Treeview, one row per record with iid = str(id).
+
+    Only a window of the list is materialized: RENDER_WINDOW rows around the
+    visible ones, moved along whenever the view nears either end of it. The
+    scrollbar is wired through on_scroll() and yview(), which translate between
+    the Treeview's view of the window and the whole list, so it measures and
+    drags over every item. show() diffs the new list against the rendered rows,
+    so re-rendering after a sync, a pushed change or a window move inserts,
+    deletes, updates or moves just the rows that differ instead of rebuilding
+    the widget.
+    """
+
+    def __init__(self, tree, window=RENDER_WINDOW):
+        self.tree = tree
+        self.window = window
+        self.media_list = []
+        self.start = 0        # index in media_list of the first rendered row
+        self.order = []       # iids of the rendered rows, in display order
+        self.rendered = {}    # iid -> row values currently shown
+        self.selected = None  # selected iid while it is outside the window, reselected once back
+
+    def show(self, media_list, keep_window=True, visible_id=None):
+        """Renders media_list. keep_window keeps the window where it was (a re-render of
+        the same view); otherwise it starts at the top, or around visible_id if given."""
+        self.media_list = media_list
+        start = self.start
+        if not keep_window:
+            start = 0
+            if visible_id is not None:
+                for index, media in enumerate(media_list):
+                    if media['id'] == visible_id:
+                        start = index - self.window // 2
+                        break
+        self._render(start)
+        if self.selected is not None and not any(media['id'] == int(self.selected) for media in media_list):
+            self.selected = None  # the selected item is gone, not just out of the window
+
+    def selection(self):
+        """The selected iid or None, including a selected row scrolled out of the window."""
+        selection = self.tree.selection()
+        return selection[0] if selection else self.selected
+
+    def select(self, iid):
+        """Selects iid now if it is rendered, otherwise once it scrolls into the window."""
+        if iid in self.rendered:
+            self.selected = None
+            if self.tree.selection() != (iid,):
+                self.tree.selection_set(iid)
+        else:
+            self.selected = iid
+
+    def scroll_to(self, top, visible=0):
+        """Shows the list from index top on, centering the window on the `visible` rows
+        from there unless they already lie well inside it."""
+        top = max(0, min(int(top), len(self.media_list) - 1))
+        if not self.start <= top < self.start + len(self.order) or self._near_edge(top, top + visible):
+            self._render(int(top + visible / 2) - self.window // 2)
+        if self.order:
+            self.tree.yview_moveto((top - self.start) / len(self.order))
+
+    def yview(self, *args):
+        """Scrollbar command: 'moveto' fractions are of the whole list; steps scroll the Treeview."""
+        if args and args[0] == 'moveto' and len(self.order) < len(self.media_list):
+            first, last = self.tree.yview()
+            self.scroll_to(float(args[1]) * len(self.media_list), (last - first) * len(self.order))
+        else:
+            self.tree.yview(*args)
+
+    def on_scroll(self, first, last):
+        """yscrollcommand hook: moves the window along as the view nears either end of it.
+
+        Returns (first, last) as fractions of the whole list, for the scrollbar.
+        """
+        first, last = float(first), float(last)
+        rendered, total = len(self.order), len(self.media_list)
+        if rendered == total:
+            return first, last
+        top = self.start + first * rendered
+        bottom = self.start + last * rendered
+        if self._near_edge(top, bottom):
+            self.scroll_to(top, bottom - top)
+        return top / total, bottom / total
+
+    def _near_edge(self, top, bottom):
+        """True if rows top..bottom come within SHIFT_MARGIN of an end of the window
+        that is not also an end of the list."""
+        margin = self.window * SHIFT_MARGIN
+        end = self.start + len(self.order)
+        return (top < self.start + margin and self.start > 0) or (bottom > end - margin and end < len(self.media_list))
+
+    def _render(self, start):
+        start = max(0, min(start, len(self.media_list) - self.window))
+        self.start = start
+        target = self.media_list[start:start + self.window]
+        target_iids = [str(media['id']) for media in target]
+        wanted = set(target_iids)
+        stale = [iid for iid in self.order if iid not in wanted]
+        if stale:
+            selection = self.tree.selection()
+            if selection:
+                self.selected = selection[0] if selection[0] in stale else None
+            self.tree.delete(*stale)
+            for iid in stale:
+                del self.rendered[iid]
+
+        # Invariant: the first `index` rows already match target. Survivors not yet
+        # placed keep their relative order, so each is either next in line or moved up.
+        survivors = [iid for iid in self.order if iid in wanted]
+        moved = set()
+        next_survivor = 0
+        for index, (iid, media) in enumerate(zip(target_iids, target)):
+            values = row_values(media)
+            shown = self.rendered.get(iid)
+            if shown is None:
+                self.tree.insert('', index, iid=iid, values=values)
+                self.rendered[iid] = values
+                continue
+            while next_survivor < len(survivors) and survivors[next_survivor] in moved:
+                next_survivor += 1
+            if survivors[next_survivor] == iid:
+                next_survivor += 1
+            else:
+                self.tree.move(iid, '', index)
+                moved.add(iid)
+            if shown != values:
+                self.tree.item(iid, values=values)
+                self.rendered[iid] = values
+        self.order = target_iids
+        if self.selected in self.rendered:
+            # Scrolled back to the selected row: select it again
+            self.tree.selection_set(self.selected)
+            self.selected = None